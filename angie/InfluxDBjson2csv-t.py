@@ -6,7 +6,11 @@
 
 import numpy as np
 import os
-import json
+import sys
+
+# the streaming converter lives in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from influx_stream import convert_file
 
 # ---- User Input Section  -----#
 #data_folder = '/users/brianvanthull2/desktop/TTNdata'
@@ -36,36 +40,6 @@ else:
 print(command)
 os.system(command)
 
-# convert json file into list of dicts, pull out headers and make csv row
-fid = open(data_folder+'\\'+json_file,'r')
-data_struct = json.load(fid)
-fid.close()
-
-headers = data_struct['results'][0]['series'][0]['columns']
-headerline = 'device,'
-nvars = len(headers)
-for v in range(0,nvars):
-	headerline = headerline + headers[v]+','
-headerline = headerline + '\n'
-
-fid = open(data_folder+'/'+csv_file,'w')
-fid.write(headerline)
-
-# find number of devices, then cycle through
-ndev = len(data_struct['results'][0]['series'])
-
-for dev in range(0,ndev):
-
-	device = data_struct['results'][0]['series'][dev]['tags']['devID']
-
-	# now cycle through data for each device, adding to the csv file
-	data = data_struct['results'][0]['series'][dev]['values']
-	ndat = len(data)
-	for d in range(0,ndat):
-		datline = device+','
-		for v in range(0,nvars):
-			datline = datline + str(data[d][v]) +','
-		datline = datline + '\n'
-		fid.write(datline)
-
-fid.close()
+# stream the json response into the csv file without loading it all into memory
+nrows = convert_file(data_folder+'\\'+json_file, data_folder+'/'+csv_file)
+print('wrote', nrows, 'rows to', data_folder+'/'+csv_file)
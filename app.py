@@ -1,63 +1,319 @@
+import itertools
 import os
+import threading
+import time
 import pandas as pd
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
-import pytz
+import plotly.io as pio
+from flask import Response, g, request
+from data_cache import FrameCache
+from heat_index import calculate_heat_index_array
+from storage import (SOURCE_FILE, parse_device_csv, partitions_in_range, read_device_range, read_partition, schema_columns,
+                     store_is_current)
+from downsample import decimate_frame
+from rollups import combined_mean, compute_rollups, hour_of_day_profile, hourly_rollup, read_tier, rollups_are_current, slice_tier, tier_metrics, tier_path
+from render_cache import Memoizer, backend_from_env, version_token
+from outdoor import OUTDOOR_DEVICE, OutdoorReference
+from rolling import HISTORY, exposure_summary, rolling_stats
+from catalog import Catalog, catalog_path, entry_has_range
+from compare import DEFAULT_THRESHOLDS, aligned_matrix, comparison_heatmap, device_stats, hour_grid, hourly_means
+from export import FORMATS, METRICS as EXPORT_METRICS, RESOLUTIONS, csv_chunks, export_columns, export_frames, parquet_chunks
+from payload import device_payload, range_payload
+from metrics import profiler, register_callback, render_text, request_seconds, timed, timer
 
 # Resolve base path relative to this file
 base_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(base_dir, 'data_processed')
+store_dir = os.path.join(base_dir, 'data_store')
+rollup_dir = os.path.join(base_dir, 'data_rollups')
+
+# Where the metric views are drawn by default: 'server' renders each selection into figures,
+# 'client' ships a device's data once and redraws date-range and metric changes in the browser
+RENDER_MODE = os.environ.get('RENDER_MODE', 'server')
 
 # Initialize the Dash app with a white theme template
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 app.title = "Environmental Data Dashboard"
 server = app.server
 
-# Load data safely without timezone conversion (already handled externally)
+# Parsed device frames shared across callbacks, invalidated when a CSV changes on disk
+device_cache = FrameCache()
+
+# Rendered callback output, reused until the selection or the underlying data changes
+render_cache = Memoizer(backend_from_env())
+
+# Devices with their metrics and date ranges, maintained by the ingest script
+device_catalog = Catalog(data_dir)
+
+# Outdoor sensor resampled and aligned against each indoor device, rebuilt when either CSV changes
+outdoor_reference = OutdoorReference(
+    lambda device, columns: load_data(data_dir, device, columns=columns),
+    lambda device: version_token([os.path.join(data_dir, f'{device}.csv')]))
+
+# Indoor device files, from the catalog rather than a directory listing
 def get_device_files():
     try:
-        return sorted([f for f in os.listdir(data_dir) if f.endswith('.csv') and not f.startswith('88439')])
+        return sorted([f'{device}.csv' for device in device_catalog.entries() if device != OUTDOOR_DEVICE])
     except Exception as e:
-        print(f"[ERROR] Cannot list data directory: {e}")
+        print(f"[ERROR] Cannot read device catalog: {e}")
         return []
 
-def load_data(directory, device):
+def load_data(directory, device, start=None, end=None, columns=None):
+    if columns is None:
+        columns = schema_columns(device)
     try:
         file_path = os.path.join(directory, f'{device}.csv')
         if os.path.exists(file_path):
-            df = pd.read_csv(file_path)
-            df['time'] = pd.to_datetime(df['time'], errors='coerce', utc=True).dt.tz_convert('America/New_York')
-            df = df[df['time'].notna()]
-            return df
+            if store_is_current(store_dir, device, file_path):
+                with timer('load_store'):
+                    df = load_partitions(device, start, end, columns)
+            else:
+                with timer('load_csv'):
+                    df = device_cache.get(file_path, file_path, timed('parse_csv')(lambda p: parse_device_csv(p, schema_columns(device))))
+                if columns is not None:
+                    df = df[[c for c in columns if c in df.columns]]
+            with timer('filter'):
+                if start is not None or end is not None:
+                    df = df.loc[start:end]
+                # reset_index returns a copy, so callers can add columns without touching the cache
+                return df.reset_index()
     except Exception as e:
         print(f"[WARN] Failed to load device {device}: {e}")
     return pd.DataFrame()
 
-def calculate_heat_index(temp_f, rh):
-    c1 = -42.379
-    c2 = 2.04901523
-    c3 = 10.14333127
-    c4 = -0.22475541
-    c5 = -6.83783e-3
-    c6 = -5.481717e-2
-    c7 = 1.22874e-3
-    c8 = 8.5282e-4
-    c9 = -1.99e-6
-    heat_index = (c1 + (c2 * temp_f) + (c3 * rh) + (c4 * temp_f * rh) +
-                  (c5 * temp_f ** 2) + (c6 * rh ** 2) +
-                  (c7 * temp_f ** 2 * rh) + (c8 * temp_f * rh ** 2) +
-                  (c9 * temp_f ** 2 * rh ** 2))
-    if temp_f < 80 or rh < 40:
-        heat_index = 0.5 * (temp_f + 61.0 + ((temp_f - 68.0) * 1.2) + (rh * 0.094))
-    elif rh < 13 and 80 <= temp_f <= 112:
-        adjustment = ((13 - rh) / 4) * ((17 - abs(temp_f - 95)) / 17) ** 0.5
-        heat_index -= adjustment
-    elif rh > 85 and 80 <= temp_f <= 87:
-        adjustment = ((rh - 85) / 10) * ((87 - temp_f) / 5)
-        heat_index += adjustment
-    return heat_index
+# A store partition with the device's schema columns, cached once whichever view reads it
+def cached_partition(device, path):
+    return device_cache.get(path, path, lambda p: read_partition(p, schema_columns(device)))
+
+# Read only the monthly partitions overlapping the range, then select the requested columns as
+# the CSV branch of load_data does
+def load_partitions(device, start, end, columns):
+    frames = [cached_partition(device, path) for path in partitions_in_range(store_dir, device, start, end)]
+    if not frames:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz='America/New_York', name='time'))
+    df = pd.concat(frames) if len(frames) > 1 else frames[0]
+    return df[[c for c in columns if c in df.columns]] if columns is not None else df
+
+# Columns read from storage for each metric view
+SUMMARY_COLUMNS = ['pm.2.5', 'tempF', 'rh', 'aqi']
+SUMMARY_METRICS = SUMMARY_COLUMNS + ['heat_index']
+
+def metric_columns(metric):
+    if metric == 'summary':
+        return SUMMARY_COLUMNS
+    if metric == 'heat_index':
+        return ['tempF', 'rh']
+    return [metric]
+
+def add_heat_index(df):
+    if 'tempF' in df.columns and 'rh' in df.columns:
+        df['heat_index'] = calculate_heat_index_array(df['tempF'], df['rh'])
+
+# Load every device and the outdoor sensor into the frame cache, as every view reads them.
+# wsgi.py calls this before the server forks, so workers start with the data in memory.
+def warm_cache():
+    for device in [f[:-4] for f in get_device_files()] + [OUTDOOR_DEVICE]:
+        file_path = os.path.join(data_dir, f'{device}.csv')
+        try:
+            if store_is_current(store_dir, device, file_path):
+                for path in partitions_in_range(store_dir, device):
+                    cached_partition(device, path)
+            elif os.path.exists(file_path):
+                device_cache.get(file_path, file_path, lambda p: parse_device_csv(p, schema_columns(device)))
+        except Exception as e:
+            print(f"[WARN] Failed to preload device {device}: {e}")
+    for device in [f[:-4] for f in get_device_files()]:
+        outdoor_reference.aligned(device)
+    return device_cache.stats()
+
+# Start warm_cache in a background thread (FAST_START in gunicorn.conf.py, and app.py run
+# directly), so the server answers while the data loads. One figure is serialized too, which
+# loads plotly's validators before the first view needs them.
+def start_warmup():
+    def warm():
+        try:
+            with timer('warmup'):
+                stats = warm_cache()
+                go.Figure(go.Scatter(x=[0], y=[0]), layout=go.Layout(template='plotly_white')).to_json()
+            print(f"Warmed up {stats['entries']} frames ({stats['bytes'] / 1e6:.1f} MB) in the background")
+        except Exception as e:
+            print(f"[WARN] Background warm-up failed: {e}")
+    threading.Thread(target=warm, name='warmup', daemon=True).start()
+
+# Reload the data in the background whenever the ingest publishes a new catalog.json (its last
+# write), so requests after a refresh find the new versions already loaded instead of parsing
+# them. Requests never wait for this: until a new version is loaded, the files they read are
+# whole old or new versions, as the ingest replaces each one atomically.
+def watch_data(interval):
+    version = version_token([catalog_path(data_dir)])
+    while True:
+        time.sleep(interval)
+        current = version_token([catalog_path(data_dir)])
+        if current == version:
+            continue
+        version = current
+        try:
+            with timer('data_reload'):
+                stats = warm_cache()
+            print(f"Reloaded data after catalog change: {stats['entries']} frames ({stats['bytes'] / 1e6:.1f} MB)")
+        except Exception as e:
+            print(f"[WARN] Background data reload failed: {e}")
+
+# Start watch_data in this process, every DATA_WATCH_SECONDS (default 30; 0 disables it).
+# Threads do not survive fork, so gunicorn starts one in each worker.
+def start_data_watcher():
+    interval = float(os.environ.get('DATA_WATCH_SECONDS', 30))
+    if interval > 0:
+        threading.Thread(target=watch_data, args=(interval,), name='data-watcher', daemon=True).start()
+
+def load_rollup(device, tier, start=None, end=None):
+    csv_path = os.path.join(data_dir, f'{device}.csv')
+    try:
+        if not rollups_are_current(rollup_dir, device, csv_path):
+            return None
+        path = tier_path(rollup_dir, device, tier)
+        return slice_tier(device_cache.get(path, path, read_tier), start, end)
+    except Exception as e:
+        print(f"[WARN] Failed to load {tier} rollup for {device}: {e}")
+    return None
+
+# Rolling PM2.5 tier rows in [start, end), computed from the hourly tier for rollups built
+# before the rolling tier existed
+def load_rolling(device, start, end):
+    if os.path.exists(tier_path(rollup_dir, device, 'rolling')):
+        return load_rollup(device, 'rolling', start, end)
+    hourly = load_rollup(device, 'hourly', start - HISTORY, end)
+    return slice_tier(rolling_stats(hourly), start, end) if hourly is not None else None
+
+# The same rows from raw readings, for devices without current rollups
+def rolling_from_raw(device, start, end):
+    df = load_data(data_dir, device, start - HISTORY, end, ['pm.2.5'])
+    if df.empty:
+        return pd.DataFrame(columns=['nowcast', 'nowcast_aqi', 'category', 'pm25_24h'])
+    return slice_tier(rolling_stats(hourly_rollup(df.set_index('time'))), start, end)
+
+# Summary statistics and daily averages from the hourly, daily and rolling rollup tiers
+def summary_from_rollups(hourly, daily, rolling):
+    metrics = tier_metrics(hourly)
+    stats = {
+        'mean': {m: combined_mean(hourly, m) for m in metrics},
+        'max_pm': hourly['pm.2.5_max'].max(),
+        'min_pm': hourly['pm.2.5_min'].min(),
+        'peak_hour': hour_of_day_profile(hourly)['pm.2.5_mean'].idxmax(),
+        'exposure': exposure_summary(rolling),
+    }
+    daily_avg = pd.DataFrame({m: daily[f'{m}_mean'].values for m in metrics})
+    daily_avg.insert(0, 'date', daily.index.date)
+    return stats, daily_avg
+
+# The same statistics computed from raw rows, with the rolling tier rows of the range
+def summary_from_raw(df, rolling):
+    metrics = [m for m in SUMMARY_METRICS if m in df.columns]
+    stats = {
+        'mean': {m: df[m].mean() for m in metrics},
+        'max_pm': df['pm.2.5'].max(),
+        'min_pm': df['pm.2.5'].min(),
+        'peak_hour': df.groupby(df['time'].dt.hour)['pm.2.5'].mean().idxmax(),
+        'exposure': exposure_summary(rolling),
+    }
+    df['date'] = df['time'].dt.date
+    daily_avg = df.groupby('date')[metrics].mean().reset_index()
+    return stats, daily_avg
+
+# Hour-of-day average for a metric over [start, end), from the hourly tier when available
+def hour_profile(device, df, metric, start, end):
+    hourly = load_rollup(device, 'hourly', start, end)
+    if hourly is not None and f'{metric}_mean' in hourly.columns:
+        profile = hour_of_day_profile(hourly[[f'{metric}_mean', f'{metric}_min', f'{metric}_max', f'{metric}_count']])
+        return pd.DataFrame({'hour': profile.index, metric: profile[f'{metric}_mean'].values})
+    df = df[df['time'] < end]
+    return df.groupby(df['time'].dt.hour.rename('hour'))[metric].mean().reset_index()
+
+# Hourly means of a metric for a device in [start, end), from the hourly tier when available
+def device_hourly(device, metric, start, end):
+    hourly = load_rollup(device, 'hourly', start, end)
+    if hourly is not None and f'{metric}_mean' in hourly.columns:
+        return hourly[f'{metric}_mean']
+    df = load_data(data_dir, device, start, end, metric_columns(metric))
+    add_heat_index(df)
+    return hourly_means(df, metric)
+
+# Rows of a device for export in [start, end]: raw rows with the heat index, or an hourly/daily
+# tier. Raw rows are read from the processed CSV rather than the float32 store or frame cache, so
+# values keep the precision they were written with and a large export does not evict the frames
+# the dashboard is serving.
+def export_rows(device, resolution, start, end, metrics):
+    if resolution != 'raw':
+        tier = load_rollup(device, resolution, start, end)
+        if tier is None:
+            raw = export_rows(device, 'raw', start, end, metrics)
+            if raw.empty:
+                return pd.DataFrame(columns=['time'])
+            raw = raw.set_index('time')
+            tier = compute_rollups(raw[raw.index < end])[resolution]
+        return tier.reset_index()
+
+    columns = list(dict.fromkeys(c for m in metrics for c in metric_columns(m)))
+    file_path = os.path.join(data_dir, f'{device}.csv')
+    if not os.path.exists(file_path):
+        return pd.DataFrame(columns=['time'] + columns)
+    df = read_device_range(file_path, start, end, columns).reset_index()
+    add_heat_index(df)
+    return df
+
+# Version token of every file a device's views are built from: its CSV, store and rollups,
+# and the same for the outdoor sensor
+def data_version(device, *args):
+    paths = []
+    for name in (device, OUTDOOR_DEVICE):
+        paths += [os.path.join(data_dir, f'{name}.csv'),
+                  os.path.join(store_dir, str(name), SOURCE_FILE),
+                  os.path.join(rollup_dir, str(name), SOURCE_FILE)]
+    return version_token(paths)
+
+# Version token for a comparison: the files of every selected device
+def comparison_version(devices, *args):
+    paths = []
+    for name in devices or []:
+        paths += [os.path.join(data_dir, f'{name}.csv'),
+                  os.path.join(store_dir, str(name), SOURCE_FILE),
+                  os.path.join(rollup_dir, str(name), SOURCE_FILE)]
+    return version_token(paths)
+
+# Hourly tier of a device, computed from its raw rows when the rollups are not current
+def hourly_tier(device, frame=None):
+    hourly = load_rollup(device, 'hourly')
+    if hourly is None:
+        if frame is None:
+            frame = load_data(data_dir, device, columns=SUMMARY_COLUMNS)
+        hourly = compute_rollups(frame.set_index('time'))['hourly'] if not frame.empty else pd.DataFrame()
+    return hourly
+
+# Everything the browser needs to draw a device's metric views (see payload.py)
+@timed('device_payload')
+@render_cache(data_version)
+def device_payload_for(device):
+    metrics = device_catalog.get(device)['metrics']
+    frame = load_data(data_dir, device, columns=SUMMARY_COLUMNS)
+    add_heat_index(frame)
+    return device_payload(device, metrics, frame, outdoor_reference.grid(), outdoor_reference.aligned(device),
+                          hourly_tier(device, frame), hourly_tier(OUTDOOR_DEVICE))
+
+# Series of a device over one date range, for ranges the device payload only holds a few
+# decimated points of
+@timed('range_payload')
+@render_cache(data_version)
+def range_payload_for(device, start_date, end_date):
+    start = pd.to_datetime(start_date).tz_localize('America/New_York')
+    end = pd.to_datetime(end_date).tz_localize('America/New_York')
+    frame = load_data(data_dir, device, start, end, SUMMARY_COLUMNS)
+    add_heat_index(frame)
+    return range_payload(device, start_date, end_date, device_catalog.get(device)['metrics'], frame,
+                         outdoor_reference.outdoor(start, end), outdoor_reference.comparison(device, start, end))
 
 def get_device_options():
     return [{'label': f[:-4], 'value': f[:-4]} for f in get_device_files()]
@@ -76,7 +332,66 @@ def get_pm25_aqi_category(avg_pm):
     else:
         return "🔵 Hazardous (250.5+ µg/m³)", "maroon"
 
+# NowCast and 24-hour PM2.5 lines of the summary report
+def exposure_report(exposure):
+    if exposure is None:
+        return []
+    lines = [html.P(f"Latest NowCast PM2.5: {exposure['nowcast']:.1f} µg/m³, AQI {exposure['nowcast_aqi']} "
+                    f"({exposure['category']}, hour of {exposure['time']:%Y-%m-%d %H:00})")]
+    if exposure['max_24h'] is not None:
+        ending = exposure['max_24h_time'] + pd.Timedelta(hours=1)
+        lines.append(html.P(f"Highest 24-hour PM2.5: {exposure['max_24h']:.2f} µg/m³ (24 hours to {ending:%Y-%m-%d %H:00})"))
+    hours = ', '.join(f"{name} {count}" for name, count in exposure['category_hours'].items() if count)
+    lines.append(html.P(f"Hours by NowCast category: {hours}"))
+    return lines
+
+def summary_report(stats, daily_avg):
+    avg_pm = stats['mean']['pm.2.5']
+    category_label, color = get_pm25_aqi_category(avg_pm)
+    metrics = [c for c in daily_avg.columns if c != 'date']
+
+    summary_text = [
+        html.H3("Summary Report"),
+        html.Div(f"Air Quality Status: {category_label}", style={'color': color, 'fontWeight': 'bold'}),
+        html.P(f"Average PM2.5: {avg_pm:.2f} µg/m³"),
+        html.P(f"Max PM2.5: {stats['max_pm']:.2f} µg/m³"),
+        html.P(f"Min PM2.5: {stats['min_pm']:.2f} µg/m³"),
+        html.P(f"Peak PM2.5 Hour: {stats['peak_hour']}:00"),
+        *exposure_report(stats['exposure']),
+        html.P(f"Average Temperature: {stats['mean']['tempF']:.2f} °F"),
+        html.P(f"Average Humidity: {stats['mean']['rh']:.2f} %"),
+        html.P(f"Average AQI: {stats['mean']['aqi']:.2f}"),
+        html.P(f"Average Heat Index: {stats['mean']['heat_index']:.2f} °F"),
+        html.H4("Daily Averages:"),
+        dcc.Graph(
+            figure=go.Figure(
+                data=[go.Scatter(x=daily_avg['date'], y=daily_avg[col], mode='lines+markers', name=col)
+                      for col in metrics],
+                layout=go.Layout(
+                    title="Daily Average Environmental Metrics",
+                    xaxis_title="Date",
+                    yaxis_title="Value",
+                    template='plotly_white'
+                )
+            )
+        )
+    ]
+    return html.Div(summary_text)
+
+# Date picker limits for a device (or all devices): its first reading's day to the day after its
+# last, since the end date is taken as midnight
+def date_bounds(device):
+    entries = device_catalog.entries()
+    if device in entries:
+        entries = {device: entries[device]}
+    firsts = [pd.Timestamp(e['first']) for e in entries.values() if e['first'] is not None]
+    lasts = [pd.Timestamp(e['last']) for e in entries.values() if e['last'] is not None]
+    if not firsts:
+        return None, None
+    return min(firsts).date(), max(lasts).date() + pd.Timedelta(days=1)
+
 # Layout
+all_dates = date_bounds(None)
 app.layout = html.Div([
     html.H1('Environmental Data Dashboard'),
     dcc.Dropdown(id='device-dropdown', options=get_device_options(), placeholder="Select a device"),
@@ -91,97 +406,431 @@ app.layout = html.Div([
             {'label': 'AQI', 'value': 'aqi'},
             {'label': 'Heat Index', 'value': 'heat_index'}
         ],
-        value='summary',
+        value='summary'
+    ),
+    dcc.RadioItems(
+        id='render-mode',
+        options=[
+            {'label': 'Render on server', 'value': 'server'},
+            {'label': 'Render in browser', 'value': 'client'}
+        ],
+        value=RENDER_MODE,
+        inline=True,
         style={'marginBottom': '20px'}
     ),
-    html.Div(id='dynamic-content')
+    dcc.Store(id='server-request'),
+    dcc.Store(id='device-payload'),
+    dcc.Store(id='range-request'),
+    dcc.Store(id='range-payload'),
+    dcc.Store(id='figure-template', data=pio.templates['plotly_white'].to_plotly_json()),
+    html.Div(id='dynamic-content'),
+    html.Div([
+        html.Div(id='client-message'),
+        html.Div([
+            dcc.Graph(id='client-timeseries'),
+            dcc.Graph(id='client-hourly'),
+            dcc.Graph(id='client-comparison', style={'display': 'none'})
+        ], id='client-graphs', style={'display': 'none'})
+    ], id='client-content', style={'display': 'none'}),
+    html.H2('Compare Devices'),
+    dcc.Dropdown(id='compare-devices', options=get_device_options() + [{'label': f'{OUTDOOR_DEVICE} (outdoor)', 'value': OUTDOOR_DEVICE}],
+                 multi=True, placeholder="Select devices to compare"),
+    dcc.DatePickerRange(id='compare-date-range', min_date_allowed=all_dates[0], max_date_allowed=all_dates[1],
+                        initial_visible_month=all_dates[1]),
+    dcc.Dropdown(
+        id='compare-metric',
+        options=[
+            {'label': 'PM2.5', 'value': 'pm.2.5'},
+            {'label': 'Temperature', 'value': 'tempF'},
+            {'label': 'Humidity', 'value': 'rh'},
+            {'label': 'AQI', 'value': 'aqi'},
+            {'label': 'Heat Index', 'value': 'heat_index'}
+        ],
+        value='pm.2.5'
+    ),
+    html.Div([
+        html.Label("Threshold: "),
+        dcc.Input(id='compare-threshold', type='number', value=DEFAULT_THRESHOLDS['pm.2.5'], debounce=True)
+    ], style={'marginBottom': '20px'}),
+    html.Div(id='compare-content')
 ])
 
-@app.callback(
-    Output('dynamic-content', 'children'),
+# Each selection goes to the server (render_requested) unless the browser draws it: metric
+# views in client mode, from the device payload (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='iaq', function_name='route'),
+    Output('server-request', 'data'),
     [Input('device-dropdown', 'value'),
      Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
-     Input('metric-selector', 'value')]
+     Input('metric-selector', 'value'),
+     Input('render-mode', 'value')],
+    State('server-request', 'data')
 )
+
+app.clientside_callback(
+    ClientsideFunction(namespace='iaq', function_name='render'),
+    [Output('client-timeseries', 'figure'),
+     Output('client-hourly', 'figure'),
+     Output('client-comparison', 'figure'),
+     Output('client-comparison', 'style'),
+     Output('client-graphs', 'style'),
+     Output('client-message', 'children'),
+     Output('client-content', 'style')],
+    [Input('device-payload', 'data'),
+     Input('range-payload', 'data'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('metric-selector', 'value'),
+     Input('render-mode', 'value')],
+    [State('device-dropdown', 'value'),
+     State('figure-template', 'data')]
+)
+
+# Ranges that hold too few of the payload's decimated points are fetched on their own
+app.clientside_callback(
+    ClientsideFunction(namespace='iaq', function_name='refine'),
+    Output('range-request', 'data'),
+    [Input('device-payload', 'data'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('metric-selector', 'value'),
+     Input('render-mode', 'value')],
+    State('range-payload', 'data')
+)
+
+@app.callback(
+    Output('dynamic-content', 'children'),
+    Input('server-request', 'data')
+)
+def render_requested(selection):
+    if selection is None:
+        return html.Div()
+    return render_dynamic_content(*selection)
+
+# The device's data for client mode, sent once per device
+@app.callback(
+    Output('device-payload', 'data'),
+    [Input('device-dropdown', 'value'),
+     Input('render-mode', 'value')]
+)
+def ship_payload(device, mode):
+    if mode != 'client' or not device or device_catalog.get(device) is None:
+        return None
+    return device_payload_for(device)
+
+@app.callback(
+    Output('range-payload', 'data'),
+    Input('range-request', 'data'),
+    prevent_initial_call=True
+)
+def ship_range_payload(selection):
+    if not selection or device_catalog.get(selection[0]) is None:
+        raise PreventUpdate
+    return range_payload_for(*selection)
+
+@timed('render_dynamic_content')
+@render_cache(data_version)
 def render_dynamic_content(device, start_date, end_date, metric):
     if not device or not start_date or not end_date:
         return html.Div("Please select a device and date range.")
 
-    df = load_data(data_dir, device)
-    outdoor_df = load_data(data_dir, '88439')
-
     start_date = pd.to_datetime(start_date).tz_localize('America/New_York')
     end_date = pd.to_datetime(end_date).tz_localize('America/New_York')
 
-    df = df[(df['time'] >= start_date) & (df['time'] <= end_date)]
-    outdoor_df = outdoor_df[(outdoor_df['time'] >= start_date) & (outdoor_df['time'] <= end_date)]
+    # Ranges and metrics the catalog knows the device has no data for are rejected unread
+    entry = device_catalog.get(device)
+    if not entry_has_range(entry, start_date, end_date):
+        return html.Div("No data available for the selected range.")
+    if metric != 'summary' and metric not in entry['metrics']:
+        return html.Div("Invalid metric selected.")
+
+    if metric == 'summary':
+        # Summaries come from the rollup tiers when they are current, without touching raw data
+        with timer('load_rollups'):
+            hourly = load_rollup(device, 'hourly', start_date, end_date)
+            daily = load_rollup(device, 'daily', start_date, end_date)
+            rolling = load_rolling(device, start_date, end_date)
+        if hourly is not None and daily is not None and rolling is not None:
+            if hourly.empty:
+                return html.Div("No data available for the selected range.")
+            with timer('summary'):
+                stats = summary_from_rollups(hourly, daily, rolling)
+            with timer('figures'):
+                return summary_report(*stats)
+
+    columns = metric_columns(metric)
+    df = load_data(data_dir, device, start_date, end_date, columns)
 
     if df.empty:
         return html.Div("No data available for the selected range.")
 
-    df['heat_index'] = df.apply(lambda row: calculate_heat_index(row['tempF'], row['rh']), axis=1)
-    outdoor_df['heat_index'] = outdoor_df.apply(lambda row: calculate_heat_index(row['tempF'], row['rh']), axis=1)
+    with timer('heat_index'):
+        add_heat_index(df)
 
     if metric == 'summary':
-        avg_pm = df['pm.2.5'].mean()
-        category_label, color = get_pm25_aqi_category(avg_pm)
-
-        df['date'] = df['time'].dt.date
-        daily_avg = df.groupby('date')[['pm.2.5', 'tempF', 'rh', 'aqi', 'heat_index']].mean().reset_index()
-
-        peak_hour = df.groupby(df['time'].dt.hour)['pm.2.5'].mean().idxmax()
-
-        summary_text = [
-            html.H3("Summary Report"),
-            html.Div(f"Air Quality Status: {category_label}", style={'color': color, 'fontWeight': 'bold'}),
-            html.P(f"Average PM2.5: {avg_pm:.2f} µg/m³"),
-            html.P(f"Max PM2.5: {df['pm.2.5'].max():.2f} µg/m³"),
-            html.P(f"Min PM2.5: {df['pm.2.5'].min():.2f} µg/m³"),
-            html.P(f"Peak PM2.5 Hour: {peak_hour}:00"),
-            html.P(f"Average Temperature: {df['tempF'].mean():.2f} °F"),
-            html.P(f"Average Humidity: {df['rh'].mean():.2f} %"),
-            html.P(f"Average AQI: {df['aqi'].mean():.2f}"),
-            html.P(f"Average Heat Index: {df['heat_index'].mean():.2f} °F"),
-            html.H4("Daily Averages:"),
-            dcc.Graph(
-                figure=go.Figure(
-                    data=[go.Scatter(x=daily_avg['date'], y=daily_avg[col], mode='lines+markers', name=col)
-                          for col in ['pm.2.5', 'tempF', 'rh', 'aqi', 'heat_index']],
-                    layout=go.Layout(
-                        title="Daily Average Environmental Metrics",
-                        xaxis_title="Date",
-                        yaxis_title="Value",
-                        template='plotly_white'
-                    )
-                )
-            )
-        ]
-        return html.Div(summary_text)
-
-    elif metric in df.columns:
-        df['hour'] = df['time'].dt.hour
-        outdoor_df['hour'] = outdoor_df['time'].dt.hour
-        hourly_avg = df.groupby('hour')[metric].mean().reset_index()
-        outdoor_hourly = outdoor_df.groupby('hour')[metric].mean().reset_index()
-
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df['time'], y=df[metric], mode='lines', name=f"{device} {metric}"))
-        fig.add_trace(go.Scatter(x=outdoor_df['time'], y=outdoor_df[metric], mode='lines', name="Outdoor 88439"))
-        fig.update_layout(title=f"{metric} Over Time", xaxis_title="Time", yaxis_title=metric, template='plotly_white')
-
-        trace_fig = go.Figure()
-        trace_fig.add_trace(go.Scatter(x=hourly_avg['hour'], y=hourly_avg[metric], mode='lines+markers', name=f'{device} Avg {metric}'))
-        trace_fig.add_trace(go.Scatter(x=outdoor_hourly['hour'], y=outdoor_hourly[metric], mode='lines+markers', name='Outdoor Avg'))
-        trace_fig.update_layout(title=f"Hourly Average {metric}", xaxis_title="Hour of Day", yaxis_title=f"Average {metric}", template='plotly_white')
-
-        return html.Div([
-            dcc.Graph(figure=fig),
-            dcc.Graph(figure=trace_fig)
-        ])
+        # Summaries cover [start, end), the whole hours and days the rollup tiers hold, so the
+        # reading at the end date's midnight is left out as it is with rollups
+        df = df[df['time'] < end_date].copy()
+        if df.empty:
+            return html.Div("No data available for the selected range.")
+        with timer('summary'):
+            stats = summary_from_raw(df, rolling_from_raw(device, start_date, end_date))
+        with timer('figures'):
+            return summary_report(*stats)
+
+    with timer('outdoor'):
+        outdoor_df = outdoor_reference.outdoor(start_date, end_date)
+
+    if metric in df.columns:
+        # The outdoor sensor does not report every metric (e.g. aqi)
+        has_outdoor = metric in outdoor_df.columns
+        with timer('hour_profile'):
+            hourly_avg = hour_profile(device, df, metric, start_date, end_date)
+            if has_outdoor:
+                outdoor_hourly = hour_profile(OUTDOOR_DEVICE, outdoor_df, metric, start_date, end_date)
+
+        with timer('figures'):
+            fig = timeseries_figure(device, metric, df, outdoor_df)
+
+            trace_fig = go.Figure()
+            trace_fig.add_trace(go.Scatter(x=hourly_avg['hour'], y=hourly_avg[metric], mode='lines+markers', name=f'{device} Avg {metric}'))
+            if has_outdoor:
+                trace_fig.add_trace(go.Scatter(x=outdoor_hourly['hour'], y=outdoor_hourly[metric], mode='lines+markers', name='Outdoor Avg'))
+            trace_fig.update_layout(title=f"Hourly Average {metric}", xaxis_title="Hour of Day", yaxis_title=f"Average {metric}", template='plotly_white')
+
+            graphs = [
+                dcc.Graph(id='timeseries-graph', figure=fig),
+                dcc.Graph(figure=trace_fig)
+            ]
+        if has_outdoor:
+            with timer('outdoor'):
+                comparison = outdoor_reference.comparison(device, start_date, end_date)
+            if not comparison.empty:
+                with timer('figures'):
+                    graphs.append(dcc.Graph(figure=comparison_figure(device, metric, comparison)))
+        return html.Div(graphs)
 
     return html.Div("Invalid metric selected.")
 
+@app.callback(
+    [Output('date-picker-range', 'min_date_allowed'),
+     Output('date-picker-range', 'max_date_allowed'),
+     Output('date-picker-range', 'initial_visible_month')],
+    Input('device-dropdown', 'value')
+)
+def constrain_dates(device):
+    first, last = date_bounds(device)
+    return first, last, last
+
+# Time series of a metric for a device and the outdoor sensor, decimated to PLOT_MAX_POINTS per trace
+def timeseries_figure(device, metric, df, outdoor_df, xrange=None):
+    fig = go.Figure()
+    device_points = decimate_frame(df, metric)
+    fig.add_trace(go.Scatter(x=device_points['time'], y=device_points[metric], mode='lines', name=f"{device} {metric}"))
+    if metric in outdoor_df.columns:
+        outdoor_points = decimate_frame(outdoor_df, metric)
+        fig.add_trace(go.Scatter(x=outdoor_points['time'], y=outdoor_points[metric], mode='lines', name=f"Outdoor {OUTDOOR_DEVICE}"))
+    fig.update_layout(title=f"{metric} Over Time", xaxis_title="Time", yaxis_title=metric, template='plotly_white')
+    if xrange is not None:
+        fig.update_xaxes(range=xrange)
+    return fig
+
+# Indoor minus outdoor and indoor/outdoor ratio of a metric, from the aligned frame
+def comparison_figure(device, metric, comparison):
+    fig = go.Figure()
+    diff_points = decimate_frame(comparison, f'{metric}_diff')
+    fig.add_trace(go.Scatter(x=diff_points['time'], y=diff_points[f'{metric}_diff'], mode='lines', name=f"{device} - Outdoor"))
+    ratio_points = decimate_frame(comparison, f'{metric}_ratio')
+    fig.add_trace(go.Scatter(x=ratio_points['time'], y=ratio_points[f'{metric}_ratio'], mode='lines', name=f"{device} / Outdoor", yaxis='y2'))
+    fig.update_layout(title=f"Indoor vs Outdoor {metric}", xaxis_title="Time", yaxis_title=f"Difference ({metric})",
+                      yaxis2=dict(title="Ratio", overlaying='y', side='right'), template='plotly_white')
+    return fig
+
+# Per-device statistics as a table, highest exceedance first
+def stats_table(stats, metric, threshold):
+    header = ['Device', f'Mean {metric}', 'Min', 'Max', 'Coverage', f'Hours > {threshold:g}', 'Highest hour']
+    rows = []
+    for row in stats.itertuples(index=False):
+        worst = row.worst_hour.strftime('%Y-%m-%d %H:00') if pd.notna(row.worst_hour) else '-'
+        rows.append(html.Tr([html.Td(row.device), html.Td(f"{row.mean:.2f}"), html.Td(f"{row.min:.2f}"),
+                             html.Td(f"{row.max:.2f}"), html.Td(f"{row.coverage:.0%}"), html.Td(row.hours_over),
+                             html.Td(worst)]))
+    return html.Table([html.Thead(html.Tr([html.Th(h) for h in header])), html.Tbody(rows)])
+
+@app.callback(
+    Output('compare-threshold', 'value'),
+    Input('compare-metric', 'value')
+)
+def default_threshold(metric):
+    return DEFAULT_THRESHOLDS.get(metric)
+
+@app.callback(
+    Output('compare-content', 'children'),
+    [Input('compare-devices', 'value'),
+     Input('compare-date-range', 'start_date'),
+     Input('compare-date-range', 'end_date'),
+     Input('compare-metric', 'value'),
+     Input('compare-threshold', 'value')]
+)
+@timed('render_comparison')
+@render_cache(comparison_version)
+def render_comparison(devices, start_date, end_date, metric, threshold):
+    if not devices or not start_date or not end_date or not metric:
+        return html.Div("Select devices and a date range to compare.")
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS.get(metric, float('inf'))
+
+    start_date = pd.to_datetime(start_date).tz_localize('America/New_York')
+    end_date = pd.to_datetime(end_date).tz_localize('America/New_York')
+    entries = device_catalog.entries()
+    devices = [d for d in devices if entry_has_range(entries.get(d), start_date, end_date) and metric in entries[d]['metrics']]
+    if not devices:
+        return html.Div("No data available for the selected devices and range.")
+
+    with timer('compare_load'):
+        index = hour_grid(start_date, end_date)
+        matrix = aligned_matrix([device_hourly(d, metric, start_date, end_date) for d in devices], index)
+    with timer('compare_stats'):
+        stats = device_stats(matrix, index, devices, threshold)
+    with timer('figures'):
+        fig = comparison_heatmap(matrix, index, devices, stats, metric, threshold)
+        return html.Div([dcc.Graph(figure=fig), stats_table(stats, metric, threshold)])
+
+# Plotly reports the axis range as wall-clock Eastern time. A time repeated when the clocks go
+# back is taken at its first occurrence for a start and its second for an end, so the window
+# covers everything drawn in it; a time skipped when they go forward moves to the end of the gap.
+def wall_clock_bound(value, end=False):
+    return pd.to_datetime(value).tz_localize('America/New_York', ambiguous=not end, nonexistent='shift_forward')
+
+# Re-fetch the time series for the zoomed window, so zooming in brings back full resolution.
+# Registered for the client-mode graph too, whose series are decimated over the whole history.
+@app.callback(
+    Output('client-timeseries', 'figure', allow_duplicate=True),
+    Input('client-timeseries', 'relayoutData'),
+    [State('device-dropdown', 'value'),
+     State('date-picker-range', 'start_date'),
+     State('date-picker-range', 'end_date'),
+     State('metric-selector', 'value')],
+    prevent_initial_call=True
+)
+@app.callback(
+    Output('timeseries-graph', 'figure'),
+    Input('timeseries-graph', 'relayoutData'),
+    [State('device-dropdown', 'value'),
+     State('date-picker-range', 'start_date'),
+     State('date-picker-range', 'end_date'),
+     State('metric-selector', 'value')],
+    prevent_initial_call=True
+)
+@timed('zoom_timeseries')
+@render_cache(lambda relayout, device, *args: data_version(device))
+def zoom_timeseries(relayout, device, start_date, end_date, metric):
+    if not relayout or not device or not start_date or not end_date:
+        raise PreventUpdate
+
+    if 'xaxis.range[0]' in relayout:
+        xrange = [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']]
+        start = wall_clock_bound(xrange[0])
+        end = wall_clock_bound(xrange[1], end=True)
+    elif relayout.get('xaxis.autorange'):
+        xrange = None
+        start = pd.to_datetime(start_date).tz_localize('America/New_York')
+        end = pd.to_datetime(end_date).tz_localize('America/New_York')
+    else:
+        raise PreventUpdate
+
+    columns = metric_columns(metric)
+    df = load_data(data_dir, device, start, end, columns)
+    outdoor_df = outdoor_reference.outdoor(start, end)
+    add_heat_index(df)
+    if metric not in df.columns:
+        raise PreventUpdate
+    return timeseries_figure(device, metric, df, outdoor_df, xrange)
+
+# Cache counters, read when /metrics is scraped
+register_callback('iaq_frame_cache_hits_total', 'Frame cache lookups served from memory', 'counter', lambda: device_cache.hits)
+register_callback('iaq_frame_cache_misses_total', 'Frame cache lookups that loaded from disk', 'counter', lambda: device_cache.misses)
+register_callback('iaq_frame_cache_bytes', 'Memory held by cached frames', 'gauge', lambda: device_cache.stats()['bytes'])
+register_callback('iaq_frame_cache_entries', 'Number of cached frames', 'gauge', lambda: device_cache.stats()['entries'])
+register_callback('iaq_render_cache_hits_total', 'Callback outputs served from the render cache', 'counter', lambda: render_cache.hits)
+register_callback('iaq_render_cache_misses_total', 'Callback outputs that had to be rendered', 'counter', lambda: render_cache.misses)
+
+# Request latency by route; the time a Dash update spends outside its callback is mostly
+# serializing the returned figures
+@server.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    profiler()
+
+@server.after_request
+def record_request_time(response):
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(route, time.perf_counter() - g.request_start)
+    return response
+
+# Exports run on the same worker threads as the dashboard; at most EXPORT_CONCURRENCY of them
+# at a time per process, so the others stay free for rendering
+export_slots = threading.BoundedSemaphore(int(os.environ.get('EXPORT_CONCURRENCY', 2)))
+
+# Streamed CSV or Parquet export; see export.py for the parameters
+@server.route('/download')
+def download_endpoint():
+    args = request.args
+    devices = [d for value in args.getlist('device') for d in value.split(',') if d]
+    metrics = [m for m in args.get('metrics', ','.join(EXPORT_METRICS)).split(',') if m]
+    resolution = args.get('resolution', 'raw')
+    fmt = args.get('format', 'csv')
+    try:
+        start = pd.to_datetime(args['start']).tz_localize('America/New_York')
+        end = pd.to_datetime(args['end']).tz_localize('America/New_York')
+    except (KeyError, ValueError):
+        return Response("start and end dates (YYYY-MM-DD) are required.\n", status=400, mimetype='text/plain')
+
+    entries = device_catalog.entries()
+    unknown = [d for d in devices if d not in entries]
+    if not devices or unknown:
+        return Response(f"Unknown or missing device: {', '.join(unknown)}\n", status=400, mimetype='text/plain')
+    bad_metrics = [m for m in metrics if m not in EXPORT_METRICS]
+    if not metrics or bad_metrics:
+        return Response(f"Metrics must be among {', '.join(EXPORT_METRICS)}\n", status=400, mimetype='text/plain')
+    if resolution not in RESOLUTIONS or fmt not in FORMATS or end < start:
+        return Response(f"resolution must be one of {', '.join(RESOLUTIONS)}, format one of {', '.join(FORMATS)}, "
+                        "and end not before start.\n", status=400, mimetype='text/plain')
+
+    if not export_slots.acquire(blocking=False):
+        return Response("Too many exports in progress, try again shortly.\n", status=429, mimetype='text/plain')
+    columns = export_columns(metrics, resolution)
+    frames = export_frames(devices, start, end, metrics, resolution, export_rows)
+    chunks = csv_chunks(frames, columns) if fmt == 'csv' else parquet_chunks(frames, columns)
+    # The first chunk holds the first device-month, so a failure there is still answered
+    # with an error status rather than a truncated 200
+    try:
+        first = next(chunks)
+    except Exception as e:
+        export_slots.release()
+        print(f"[WARN] Export failed: {e}")
+        return Response("Export failed.\n", status=500, mimetype='text/plain')
+    filename = f"iaq_{resolution}_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}"
+    response = Response(itertools.chain([first], chunks), mimetype=FORMATS[fmt], headers={'Content-Disposition': f'attachment; filename={filename}'})
+    response.call_on_close(export_slots.release)
+    return response
+
+@server.route('/metrics')
+def metrics_endpoint():
+    return Response(render_text(), mimetype='text/plain; version=0.0.4')
+
+# Collapsed stacks from the sampling profiler (PROFILE_SAMPLING=1); ?reset=1 starts a new window
+@server.route('/debug/profile')
+def profile_endpoint():
+    sampler = profiler()
+    if sampler is None:
+        return Response("Sampling profiler is off; set PROFILE_SAMPLING=1 to enable it.\n", status=404, mimetype='text/plain')
+    return Response(sampler.collapsed(reset=request.args.get('reset') == '1'), mimetype='text/plain')
+
 if __name__ == "__main__":
+    start_warmup()
+    start_data_watcher()
     port = int(os.environ.get("PORT", 5000))
     app.run_server(debug=False, host="0.0.0.0", port=port)
@@ -0,0 +1,180 @@
+// Clientside callbacks for the "client" render mode (app.py, RENDER_MODE).
+//
+// The device payload (see payload.py) holds decimated series and hourly means with times as
+// epoch milliseconds of Eastern wall-clock time; the date picker's days are compared in the
+// same terms. The figures mirror timeseries_figure, the hourly profile and comparison_figure
+// in app.py, and rows are selected the same way: readings in [start, end], hourly buckets
+// in [start, end).
+//
+// A range that holds fewer than half of the points the server would draw for it (its readings,
+// counted from the hourly buckets, up to max_points) is requested as a range payload, and
+// drawn from that once it arrives.
+
+(function () {
+    var DAY_MS = 86400000;
+    var HOUR_MS = 3600000;
+
+    // Midnight of a date picker value ('YYYY-MM-DD...') as wall-clock milliseconds
+    function dayStart(date) {
+        return Date.parse(date.slice(0, 10) + 'T00:00:00Z');
+    }
+
+    // First index whose time is >= value (or > value with after=true)
+    function bound(times, value, after) {
+        var lo = 0, hi = times.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (times[mid] < value || (after && times[mid] === value)) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    // Points of a series in [start, end]
+    function slice(series, start, end) {
+        var a = bound(series.t, start, false);
+        var b = bound(series.t, end, true);
+        return {x: series.t.slice(a, b), y: series.y.slice(a, b)};
+    }
+
+    // Count-weighted hour-of-day means of the hourly buckets in [start, end)
+    function hourProfile(hourly, metric, start, end) {
+        var values = hourly[metric];
+        var sums = [], counts = [];
+        for (var h = 0; h < 24; h++) {
+            sums.push(0);
+            counts.push(0);
+        }
+        if (values) {
+            var a = bound(hourly.t, start, false);
+            var b = bound(hourly.t, end, false);
+            for (var i = a; i < b; i++) {
+                var hour = Math.floor((hourly.t[i] % DAY_MS) / HOUR_MS);
+                sums[hour] += values.mean[i] * values.count[i];
+                counts[hour] += values.count[i];
+            }
+        }
+        var x = [], y = [];
+        for (h = 0; h < 24; h++) {
+            if (counts[h] > 0) {
+                x.push(h);
+                y.push(sums[h] / counts[h]);
+            }
+        }
+        return {x: x, y: y};
+    }
+
+    // Readings of a metric in the hourly buckets in [start, end)
+    function readings(hourly, metric, start, end) {
+        var values = hourly[metric];
+        var total = 0;
+        if (values) {
+            var b = bound(hourly.t, end, false);
+            for (var i = bound(hourly.t, start, false); i < b; i++) {
+                total += values.count[i];
+            }
+        }
+        return total;
+    }
+
+    function sameRange(selection, device, startDate, endDate) {
+        return Boolean(selection) && selection.device === device && selection.start === startDate && selection.end === endDate;
+    }
+
+    function line(points, name, extra) {
+        return Object.assign({x: points.x, y: points.y, type: 'scatter', mode: 'lines', name: name}, extra || {});
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        iaq: {
+            // Selection for the server-rendered view, or null while the browser draws it
+            route: function (device, startDate, endDate, metric, mode, current) {
+                if (mode === 'client' && metric !== 'summary') {
+                    return current === null || current === undefined ? window.dash_clientside.no_update : null;
+                }
+                return [device || null, startDate || null, endDate || null, metric];
+            },
+
+            // [device, start date, end date] of a range to fetch densely, or no update
+            refine: function (payload, startDate, endDate, metric, mode, current) {
+                var noUpdate = window.dash_clientside.no_update;
+                if (mode !== 'client' || metric === 'summary' || !payload || !startDate || !endDate) {
+                    return noUpdate;
+                }
+                var series = payload.series[metric];
+                if (!series || !series.decimated || sameRange(current, payload.device, startDate, endDate)) {
+                    return noUpdate;
+                }
+                var start = dayStart(startDate), end = dayStart(endDate);
+                var points = bound(series.t, end, true) - bound(series.t, start, false);
+                var wanted = Math.min(readings(payload.hourly, metric, start, end), payload.max_points);
+                return points < wanted / 2 ? [payload.device, startDate, endDate] : noUpdate;
+            },
+
+            // [timeseries, hourly, comparison, comparison style, graphs style, message, content style]
+            render: function (payload, rangePayload, startDate, endDate, metric, mode, device, template) {
+                var noUpdate = window.dash_clientside.no_update;
+                var hidden = {display: 'none'}, shown = {display: 'block'};
+                if (mode !== 'client' || metric === 'summary') {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, '', hidden];
+                }
+                if (!device || !startDate || !endDate) {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, hidden, 'Please select a device and date range.', shown];
+                }
+                if (!payload || payload.device !== device) {
+                    // The new device's payload is on its way
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, hidden, '', shown];
+                }
+                if (payload.metrics.indexOf(metric) < 0 || !payload.series[metric]) {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, hidden, 'Invalid metric selected.', shown];
+                }
+
+                // Series from the range payload once it has arrived for this range
+                var source = sameRange(rangePayload, device, startDate, endDate) ? rangePayload : payload;
+                var start = dayStart(startDate), end = dayStart(endDate);
+                var points = source.series[metric] ? slice(source.series[metric], start, end) : {x: []};
+                if (points.x.length === 0) {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate, hidden, 'No data available for the selected range.', shown];
+                }
+                var hasOutdoor = Boolean(payload.outdoor[metric]) && Boolean(source.outdoor[metric]);
+
+                var traces = [line(points, device + ' ' + metric)];
+                if (hasOutdoor) {
+                    traces.push(line(slice(source.outdoor[metric], start, end), 'Outdoor 88439'));
+                }
+                var timeseries = {data: traces, layout: {
+                    title: {text: metric + ' Over Time'}, template: template,
+                    xaxis: {title: {text: 'Time'}, type: 'date'}, yaxis: {title: {text: metric}}}};
+
+                var profile = hourProfile(payload.hourly, metric, start, end);
+                var profileTraces = [line(profile, device + ' Avg ' + metric, {mode: 'lines+markers'})];
+                if (hasOutdoor) {
+                    profileTraces.push(line(hourProfile(payload.outdoor_hourly, metric, start, end), 'Outdoor Avg', {mode: 'lines+markers'}));
+                }
+                var hourly = {data: profileTraces, layout: {
+                    title: {text: 'Hourly Average ' + metric}, template: template,
+                    xaxis: {title: {text: 'Hour of Day'}}, yaxis: {title: {text: 'Average ' + metric}}}};
+
+                var comparison = noUpdate, comparisonStyle = hidden;
+                var diff = source.comparison[metric + '_diff'], ratio = source.comparison[metric + '_ratio'];
+                if (hasOutdoor && diff && ratio) {
+                    var diffPoints = slice(diff, start, end);
+                    if (diffPoints.x.length > 0) {
+                        comparison = {data: [
+                            line(diffPoints, device + ' - Outdoor'),
+                            line(slice(ratio, start, end), device + ' / Outdoor', {yaxis: 'y2'})
+                        ], layout: {
+                            title: {text: 'Indoor vs Outdoor ' + metric}, template: template,
+                            xaxis: {title: {text: 'Time'}, type: 'date'}, yaxis: {title: {text: 'Difference (' + metric + ')'}},
+                            yaxis2: {title: {text: 'Ratio'}, overlaying: 'y', side: 'right'}}};
+                        comparisonStyle = shown;
+                    }
+                }
+                return [timeseries, hourly, comparison, comparisonStyle, shown, '', shown];
+            }
+        }
+    });
+})();
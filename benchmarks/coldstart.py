@@ -0,0 +1,131 @@
+# Cold-start measurements: how long a fresh interpreter takes to import the dashboard, and how
+# long a freshly started gunicorn takes to answer, with and without FAST_START:
+#
+#     >> python benchmarks/coldstart.py
+#     >> python benchmarks/coldstart.py --repeat 5 --modes default,fast
+#
+# For each start the server is launched as the Procfile does (on a free local port, one
+# worker by default), and the time from launch is recorded until the port accepts a
+# connection, the page is served, and a device's summary view is served. The summary is
+# requested for the first indoor device in data_processed/catalog.json, over its last week.
+# The median of --repeat starts is printed; use --output to also write the results as JSON.
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {'default': {}, 'fast': {'FAST_START': '1'}}
+OUTDOOR_DEVICE = '88439'
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import dash
+dash_done = time.perf_counter()
+import pandas
+pandas_done = time.perf_counter()
+import app
+done = time.perf_counter()
+print(dash_done - start, pandas_done - dash_done, done - pandas_done, done - start)
+"""
+
+
+def import_times():
+    out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=base_dir, capture_output=True,
+                         text=True, check=True).stdout.split()
+    return dict(zip(['dash', 'pandas', 'app_rest', 'total'], map(float, out[-4:])))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Device and date range of the summary request, from the catalog
+def summary_request(data_dir):
+    with open(os.path.join(data_dir, 'catalog.json')) as fid:
+        catalog = json.load(fid)
+    device, entry = next((d, e) for d, e in sorted(catalog.items()) if d != OUTDOOR_DEVICE and e['last'] is not None)
+    last = date.fromisoformat(entry['last'][:10])
+    selection = [device, (last - timedelta(days=7)).isoformat(), (last + timedelta(days=1)).isoformat(), 'summary']
+    return {'output': 'dynamic-content.children', 'outputs': {'id': 'dynamic-content', 'property': 'children'},
+            'inputs': [{'id': 'server-request', 'property': 'data', 'value': selection}],
+            'changedPropIds': ['server-request.data'], 'state': []}
+
+
+def wait_for(check, started, timeout):
+    while time.perf_counter() - started < timeout:
+        try:
+            if check():
+                return time.perf_counter() - started
+        except urllib.error.HTTPError:
+            raise
+        except OSError:  # not listening yet
+            pass
+        time.sleep(0.01)
+    raise TimeoutError('server did not answer in time')
+
+
+def first_response(env, body, timeout):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, PORT=str(port), **env)
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:server'],
+                              cwd=base_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        bound = wait_for(lambda: socket.create_connection(('127.0.0.1', port), timeout=1).close() is None,
+                         started, timeout)
+        page = wait_for(lambda: urllib.request.urlopen(url + '/', timeout=timeout).status == 200, started, timeout)
+        request = urllib.request.Request(url + '/_dash-update-component', data=json.dumps(body).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        view = wait_for(lambda: urllib.request.urlopen(request, timeout=timeout).status == 200, started, timeout)
+        return {'bound': bound, 'page': page, 'summary': view}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def median(runs, key):
+    return statistics.median(run[key] for run in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time and time to first response')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated subset of: ' + ', '.join(MODES))
+    parser.add_argument('--workers', default='1', help='WEB_CONCURRENCY for the server')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = {'import': [import_times() for _ in range(args.repeat)], 'start': {}}
+    print('import seconds (median):', ', '.join(f"{k} {median(results['import'], k):.3f}" for k in results['import'][0]))
+
+    body = summary_request(os.path.join(base_dir, 'data_processed'))
+    # A filesystem render cache would answer the summary from an earlier start
+    env = {'WEB_CONCURRENCY': args.workers, 'DATA_WATCH_SECONDS': '0', 'RENDER_CACHE': 'off'}
+    print(f"\n{'mode':<10}{'bound s':>10}{'page s':>10}{'summary s':>12}")
+    for mode in args.modes.split(','):
+        runs = [first_response(dict(env, **MODES[mode]), body, args.timeout) for _ in range(args.repeat)]
+        results['start'][mode] = runs
+        print(f"{mode:<10}{median(runs, 'bound'):>10.3f}{median(runs, 'page'):>10.3f}{median(runs, 'summary'):>12.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as fid:
+            json.dump(results, fid, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
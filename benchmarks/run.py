@@ -0,0 +1,250 @@
+# Benchmarks for the dashboard data path and the ingestion scripts.
+#
+# Generates synthetic data of the requested size in a temporary directory, then times each
+# stage (best and median of --repeat runs) and, in a separate pass under tracemalloc, records
+# its peak Python memory. Timing runs are not traced, as tracemalloc slows pandas down a lot.
+# Results are printed and written as JSON, so runs can be compared:
+#
+#     >> python benchmarks/run.py --rows 50000
+#     >> python benchmarks/run.py --rows 50000 --baseline benchmarks/results/<earlier>.json
+#
+# Use --stages to run a subset, e.g. --stages parse_csv,heat_index_vectorized.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+# Rendered output must not be served from the render cache while it is being timed
+os.environ['RENDER_CACHE'] = 'off'
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import app
+import synthetic
+from catalog import Catalog
+from csvbydevice_final_fixed_nyc import read_awair_file, read_mcci_file, read_purpleair_file
+from heat_index import calculate_heat_index, calculate_heat_index_array
+from influx_stream import convert_file
+from rollups import compute_rollups
+from storage import parse_device_csv, write_partitions
+
+
+# Each stage is (setup, run): setup prepares untimed state and returns the argument for run;
+# run returns the number of rows it processed
+def build_stages(ctx):
+    devices = ctx['devices']
+    paths = [os.path.join(ctx['data_dir'], f'{d}.csv') for d in devices + ['88439']]
+    mcci, awair = devices[0], devices[-1]
+    start, end = ctx['start'], ctx['end']
+
+    def frame(device):
+        return app.load_data(ctx['data_dir'], device)
+
+    def cold_cache():
+        app.device_cache.invalidate()
+
+    def load_all(_):
+        return sum(len(app.load_data(ctx['data_dir'], d, start, end)) for d in devices)
+
+    def render(metric):
+        def run(_):
+            out = app.render_dynamic_content(mcci, ctx['start_date'], ctx['end_date'], metric)
+            ctx['rendered'] = out
+            return ctx['rows']
+        return run
+
+    def heat_index_inputs():
+        return frame(mcci)[['tempF', 'rh']]
+
+    def summary_input():
+        df = frame(mcci)[['time'] + app.SUMMARY_COLUMNS]
+        app.add_heat_index(df)
+        return df
+
+    def summary(df):
+        app.summary_from_raw(df)
+        return len(df)
+
+    def serialize(_):
+        to_json_plotly(ctx['rendered'])
+        return ctx['rows']
+
+    def rollups(df):
+        compute_rollups(df)
+        return len(df)
+
+    def partition_inputs():
+        shutil.rmtree(os.path.join(ctx['work_dir'], 'data_store'), ignore_errors=True)
+        return parse_device_csv(paths[0])
+
+    def partitions(df):
+        write_partitions(os.path.join(ctx['work_dir'], 'data_store'), mcci, df)
+        return len(df)
+
+    def ingest(reader, family):
+        return lambda _: sum(len(df) for df in reader(ctx['raw'][family]).values())
+
+    return {
+        'parse_csv': (None, lambda _: sum(len(parse_device_csv(p)) for p in paths)),
+        'load_data_cold': (cold_cache, load_all),
+        'load_data_warm': (lambda: load_all(None), load_all),
+        'heat_index_scalar': (heat_index_inputs,
+                              lambda df: len(df.apply(lambda r: calculate_heat_index(r['tempF'], r['rh']), axis=1))),
+        'heat_index_vectorized': (heat_index_inputs,
+                                  lambda df: len(calculate_heat_index_array(df['tempF'], df['rh']))),
+        'summary_raw': (summary_input, summary),
+        'render_summary': (None, render('summary')),
+        'render_metric': (None, render('pm.2.5')),
+        'serialize_render': (lambda: render('pm.2.5')(None), serialize),
+        'outdoor_align': (lambda: app.outdoor_reference._aligned.clear(),
+                          lambda _: len(app.outdoor_reference.aligned(awair))),
+        'compute_rollups': (lambda: parse_device_csv(paths[0]), rollups),
+        'write_partitions': (partition_inputs, partitions),
+        'ingest_mcci': (None, ingest(read_mcci_file, 'mcci')),
+        'ingest_awair': (None, ingest(read_awair_file, 'awair')),
+        'ingest_purpleair': (None, ingest(read_purpleair_file, 'purpleair')),
+        'influx_convert': (None, lambda _: convert_file(ctx['influx_json'], os.path.join(ctx['work_dir'], 'influx.csv'))),
+    }
+
+
+def time_stage(setup, run, repeat):
+    seconds = []
+    rows = 0
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        rows = run(arg)
+        seconds.append(time.perf_counter() - t0)
+    return rows, seconds
+
+
+def peak_memory(setup, run):
+    arg = setup() if setup else None
+    tracemalloc.start()
+    try:
+        run(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=base_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare(work_dir, rows, seed):
+    data_dir = os.path.join(work_dir, 'data_processed')
+    devices = synthetic.write_processed(data_dir, rows, seed=seed)
+    raw = synthetic.write_raw(os.path.join(work_dir, 'data_unprocessed'), rows, seed=seed)
+    influx_json = synthetic.write_influx_json(os.path.join(work_dir, 'influx.json'), rows, seed=seed)
+
+    # Point the dashboard at the synthetic data; without a store or rollups it reads the CSVs
+    app.data_dir = data_dir
+    app.store_dir = os.path.join(work_dir, 'data_store')
+    app.rollup_dir = os.path.join(work_dir, 'data_rollups')
+    app.device_catalog = Catalog(data_dir)
+
+    first = pd.Timestamp(synthetic.START)
+    last = first + pd.Timedelta(seconds=600 * rows)
+    return {
+        'work_dir': work_dir, 'data_dir': data_dir, 'devices': devices, 'raw': raw,
+        'influx_json': influx_json, 'rows': rows,
+        'start_date': first.strftime('%Y-%m-%d'), 'end_date': (last + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+        'start': first.tz_localize(synthetic.TIMEZONE), 'end': (last + pd.Timedelta(days=1)).tz_localize(synthetic.TIMEZONE),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as fid:
+        baseline = json.load(fid)['stages']
+    print(f"\nChange vs {os.path.basename(baseline_path)} (best time; < 1 is faster):")
+    for name, stage in results['stages'].items():
+        if name in baseline and baseline[name]['seconds_best'] > 0:
+            ratio = stage['seconds_best'] / baseline[name]['seconds_best']
+            print(f"  {name:<24}{ratio:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard data path and ingestion')
+    parser.add_argument('--rows', type=int, default=20000, help='rows per synthetic device')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', help='comma-separated subset of stages')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='iaq_bench_')
+    try:
+        ctx = prepare(work_dir, args.rows, args.seed)
+        stages = build_stages(ctx)
+        names = args.stages.split(',') if args.stages else list(stages)
+        unknown = [n for n in names if n not in stages]
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(unknown)} (available: {', '.join(stages)})")
+
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'commit': git_commit(),
+                'rows': args.rows,
+                'repeat': args.repeat,
+                'seed': args.seed,
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+            },
+            'stages': {},
+        }
+        print(f"{'stage':<24}{'rows':>10}{'best s':>10}{'median s':>10}{'rows/s':>12}{'peak MB':>10}")
+        for name in names:
+            setup, run = stages[name]
+            rows, seconds = time_stage(setup, run, args.repeat)
+            peak = None if args.no_memory else peak_memory(setup, run)
+            best = min(seconds)
+            stage = {
+                'rows': rows,
+                'seconds_best': best,
+                'seconds_median': statistics.median(seconds),
+                'rows_per_s': rows / best if best > 0 else None,
+                'peak_bytes': peak,
+            }
+            results['stages'][name] = stage
+            peak_mb = f"{peak / 1e6:.1f}" if peak is not None else '-'
+            print(f"{name:<24}{rows:>10}{best:>10.4f}{stage['seconds_median']:>10.4f}{stage['rows_per_s'] or 0:>12.0f}{peak_mb:>10}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(base_dir, 'benchmarks', 'results',
+                                         results['meta']['timestamp'].replace(':', '') + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as fid:
+        json.dump(results, fid, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
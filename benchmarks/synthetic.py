@@ -0,0 +1,133 @@
+# Synthetic device data shaped like the real exports, for the benchmarks.
+#
+# Processed CSVs follow the data_processed layouts (MCCI eui-*, awair-omni_*, PurpleAir 88439);
+# raw files follow what the ingest script reads from data_unprocessed, and the InfluxDB JSON
+# follows a /query response. Values are seeded random walks in realistic ranges, so runs
+# with the same size and seed produce identical files.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+TIMEZONE = 'America/New_York'
+START = '2024-03-01'
+
+MCCI_COLUMNS = ['aqi', 'TVOC', 'dust.0.3', 'dust.0.5', 'dust.1.0', 'dust.2.5', 'dust.5', 'dust.10',
+                'pm.1.0', 'pm.2.5', 'pm.10', 'tempC', 'rh', 'tDewC', 'vBat', 'boot']
+AWAIR_COLUMNS = ['pm.10', 'aqi', 'tempF', 'rh', 'co2', 'voc', 'pm.2.5', 'noise', 'light']
+PURPLEAIR_COLUMNS = ['rh', 'tempF', 'pressure', 'pm.2.5']
+
+# (low, high) of each series
+RANGES = {
+    'aqi': (0, 150), 'TVOC': (0, 600), 'dust.0.3': (0, 2000), 'dust.0.5': (0, 600),
+    'dust.1.0': (0, 100), 'dust.2.5': (0, 20), 'dust.5': (0, 10), 'dust.10': (0, 5),
+    'pm.1.0': (0, 40), 'pm.2.5': (0, 60), 'pm.10': (0, 80), 'tempC': (10, 35), 'tempF': (50, 95),
+    'rh': (15, 90), 'tDewC': (-5, 25), 'vBat': (3.6, 4.2), 'boot': (1, 10), 'co2': (400, 2000),
+    'voc': (0, 500), 'noise': (30, 80), 'light': (0, 500), 'pressure': (995, 1030),
+}
+
+
+def random_walk(rng, n, low, high):
+    steps = rng.normal(0, (high - low) / 200, n)
+    walk = np.cumsum(steps) + (low + high) / 2
+    # Reflect back into range
+    span = high - low
+    walk = np.abs((walk - low) % (2 * span) - span)
+    return low + span - walk
+
+
+def timestamps(rng, n, freq_s, jitter_s=0.0):
+    offsets = np.arange(n) * freq_s
+    if jitter_s:
+        offsets = offsets + rng.uniform(0, jitter_s, n)
+    return pd.Timestamp(START, tz=TIMEZONE) + pd.to_timedelta(offsets, unit='s')
+
+
+def readings(rng, n, columns):
+    return {c: random_walk(rng, n, *RANGES[c]).round(3) for c in columns}
+
+
+# Processed MCCI frame: readings every ~6 minutes with sub-second timestamps
+def mcci_frame(rng, n, device):
+    columns = [c for c in MCCI_COLUMNS if c != 'tempC']
+    df = pd.DataFrame({'device': device, 'time': timestamps(rng, n, 358, 5)})
+    df = df.assign(**readings(rng, n, columns))
+    df['Unnamed: 18'] = np.nan
+    df['tempF'] = random_walk(rng, n, *RANGES['tempF']).round(3)
+    return df
+
+
+def awair_frame(rng, n):
+    return pd.DataFrame({'time': timestamps(rng, n, 300), **readings(rng, n, AWAIR_COLUMNS)})
+
+
+def purpleair_frame(rng, n):
+    return pd.DataFrame({'time': timestamps(rng, n, 600), **readings(rng, n, PURPLEAIR_COLUMNS)})
+
+
+# data_processed-style directory: n_mcci eui-* devices, n_awair awair-omni_* devices and 88439
+def write_processed(directory, rows, n_mcci=2, n_awair=2, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    devices = []
+    for i in range(n_mcci):
+        device = f'eui-{0x0002cc0100000a00 + i:016x}'
+        mcci_frame(rng, rows, device).to_csv(os.path.join(directory, f'{device}.csv'), index=False)
+        devices.append(device)
+    for i in range(n_awair):
+        device = f'awair-omni_{50000 + i}'
+        awair_frame(rng, rows).to_csv(os.path.join(directory, f'{device}.csv'), index=False)
+        devices.append(device)
+    purpleair_frame(rng, rows).to_csv(os.path.join(directory, '88439.csv'), index=False)
+    return devices
+
+
+# Raw exports as found in data_unprocessed/{mcci,awair,purpleair}_unprocessed
+def write_raw(directory, rows, n_mcci=2, seed=0):
+    rng = np.random.default_rng(seed)
+    paths = {}
+
+    # MCCI: several devices in one UTC file, as written by InfluxDBjson2csv.py (trailing comma)
+    frames = []
+    for i in range(n_mcci):
+        df = pd.DataFrame({'device': f'eui-{0x0002cc0100000a00 + i:016x}',
+                           'time': timestamps(rng, rows, 358, 5).tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ')})
+        frames.append(df.assign(**readings(rng, rows, MCCI_COLUMNS), **{'': ''}))
+    paths['mcci'] = os.path.join(directory, 'mcci_unprocessed', 'mcci_export.csv')
+
+    # Awair: Eastern wall-clock time, vendor column names
+    awair = awair_frame(rng, rows).rename(columns={'time': 'timestamp(America/New_York)', 'tempF': 'temp(°F)',
+                                                   'rh': 'humid', 'pm.10': 'pm10', 'pm.2.5': 'pm25', 'aqi': 'score'})
+    awair['timestamp(America/New_York)'] = awair['timestamp(America/New_York)'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    paths['awair'] = os.path.join(directory, 'awair_unprocessed', 'awair-omni_50000.csv')
+
+    # PurpleAir: UTC timestamps, vendor column names
+    purpleair = purpleair_frame(rng, rows).rename(columns={'time': 'time_stamp', 'tempF': 'temperature',
+                                                           'rh': 'humidity', 'pm.2.5': 'pm2.5_alt'})
+    purpleair['time_stamp'] = purpleair['time_stamp'].dt.tz_convert('UTC').dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    paths['purpleair'] = os.path.join(directory, 'purpleair_unprocessed', '88439.csv')
+
+    for family, frame in [('mcci', pd.concat(frames)), ('awair', awair), ('purpleair', purpleair)]:
+        os.makedirs(os.path.dirname(paths[family]), exist_ok=True)
+        frame.to_csv(paths[family], index=False)
+    return paths
+
+
+# InfluxDB /query JSON response with one series per device
+def write_influx_json(path, rows, n_mcci=2, seed=0):
+    rng = np.random.default_rng(seed)
+    series = []
+    for i in range(n_mcci):
+        times = timestamps(rng, rows, 358, 5).tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        values = readings(rng, rows, MCCI_COLUMNS)
+        series.append({
+            'name': 'EnvironmentalData',
+            'tags': {'devID': f'eui-{0x0002cc0100000a00 + i:016x}'},
+            'columns': ['time'] + MCCI_COLUMNS,
+            'values': [[t] + list(row) for t, row in zip(times, zip(*(values[c].tolist() for c in MCCI_COLUMNS)))],
+        })
+    with open(path, 'w') as fid:
+        json.dump({'results': [{'statement_id': 0, 'series': series}]}, fid)
+    return path
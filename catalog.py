@@ -0,0 +1,155 @@
+# Catalog of the processed devices, kept next to the CSVs as data_processed/catalog.json:
+#
+#     {"<device>": {"family": "mcci", "metrics": [...], "first": "<iso time>", "last": "<iso time>",
+#                   "rows": 17637, "version": {"size": <bytes>, "sha256": "<hex>"}}, ...}
+#
+# The ingest script updates the entries of the devices it writes, so the dashboard can list
+# devices and their date ranges without opening any data file. The version is the CSV's
+# size and content hash (modification times do not survive a git checkout or a deploy); the
+# dashboard compares sizes only, and re-describes a device whose CSV no longer matches.
+#
+# Rebuild it from the processed CSVs with:  >> python catalog.py
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from data_cache import file_version
+from storage import device_family, parse_device_csv, read_csv_header, schema_columns
+
+CATALOG_FILE = 'catalog.json'
+
+
+def catalog_path(data_dir):
+    return os.path.join(data_dir, CATALOG_FILE)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fid:
+        for block in iter(lambda: fid.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Catalog entry for a processed CSV; only its header and time column are read
+def describe_device(csv_path, device):
+    header = read_csv_header(csv_path)
+    metrics = [m for m in schema_columns(device) if m in header]
+    if 'tempF' in metrics and 'rh' in metrics:
+        metrics.append('heat_index')
+    times = parse_device_csv(csv_path, columns=[]).index
+    return {
+        'family': device_family(device),
+        'metrics': metrics,
+        'first': times[0].isoformat() if len(times) else None,
+        'last': times[-1].isoformat() if len(times) else None,
+        'rows': len(times),
+        'version': {'size': os.path.getsize(csv_path), 'sha256': file_sha256(csv_path)},
+    }
+
+
+def load_catalog(data_dir):
+    try:
+        with open(catalog_path(data_dir)) as fid:
+            return json.load(fid)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_catalog(data_dir, catalog):
+    path = catalog_path(data_dir)
+    with open(path + '.tmp', 'w') as fid:
+        json.dump(catalog, fid, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+# Set the entries of the given devices ({device: entry}) and save
+def update_catalog(data_dir, entries):
+    catalog = load_catalog(data_dir)
+    catalog.update(entries)
+    save_catalog(data_dir, catalog)
+    return catalog
+
+
+def build_catalog(data_dir):
+    catalog = {}
+    for file in sorted(os.listdir(data_dir)):
+        if not file.endswith('.csv'):
+            continue
+        try:
+            catalog[file[:-4]] = describe_device(os.path.join(data_dir, file), file[:-4])
+        except Exception as e:
+            print(f"[WARN] Skipping {file}: {e}")
+    save_catalog(data_dir, catalog)
+    return catalog
+
+
+# The dashboard's view of the catalog. Reloaded when catalog.json changes; entries whose CSV
+# changed size or disappeared are re-described or dropped. Without a catalog file it is built
+# from the directory listing.
+class Catalog:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._version = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        path = catalog_path(self.data_dir)
+        try:
+            version = file_version(path)
+        except OSError:
+            version = None
+        if version is not None and version == self._version:
+            return
+        self._entries = load_catalog(self.data_dir) if version is not None else {}
+        if version is None:
+            try:
+                self._entries = build_catalog(self.data_dir)
+                version = file_version(path)
+            except OSError as e:
+                print(f"[WARN] Cannot build device catalog: {e}")
+        self._version = version
+
+    def _validate(self):
+        changed = {}
+        for device, entry in list(self._entries.items()):
+            csv_path = os.path.join(self.data_dir, f'{device}.csv')
+            try:
+                size = os.path.getsize(csv_path)
+            except OSError:
+                del self._entries[device]
+                continue
+            if size != entry['version']['size']:
+                changed[device] = describe_device(csv_path, device)
+        self._entries.update(changed)
+
+    def entries(self):
+        with self._lock:
+            self._load()
+            self._validate()
+            return dict(self._entries)
+
+    def get(self, device):
+        return self.entries().get(device)
+
+
+# Whether [start, end] (tz-aware) overlaps the device's readings
+def entry_has_range(entry, start, end):
+    if entry is None or entry['first'] is None:
+        return False
+    return pd.Timestamp(entry['first']) <= end and pd.Timestamp(entry['last']) >= start
+
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Rebuild the device catalog from the processed CSVs')
+    parser.add_argument('--source', default=os.path.join(base_dir, 'data_processed'))
+    args = parser.parse_args()
+    for device, entry in build_catalog(args.source).items():
+        print(f"{device:<24} {entry['family']:<10} {entry['rows']:>7} rows  {entry['first']} .. {entry['last']}")
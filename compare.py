@@ -0,0 +1,106 @@
+# Comparison of several devices for one metric over a date range.
+#
+# Each device's hourly means are placed as a column of one (hours x devices) matrix on a
+# common hourly grid covering [start, end), with NaN where a device has no readings. Every
+# statistic is then a single numpy reduction over that matrix, so the cost grows with the
+# number of hourly cells rather than with a per-device pass over raw rows:
+#
+#     mean, min, max      over the hours with data
+#     coverage            fraction of the grid's hours with data
+#     hours_over          hours whose mean is above the threshold
+#     worst_hour          start of the hour with the highest mean (NaT without data)
+#
+# The heatmap shows the same matrix, with hours averaged into wider buckets when the range
+# has more than MAX_COLUMNS of them.
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+GRID = 'h'
+MAX_COLUMNS = 1500
+
+# Exceedance threshold offered for each metric; the PM2.5 value is the EPA 24-hour standard
+DEFAULT_THRESHOLDS = {'pm.2.5': 35.0, 'tempF': 80.0, 'rh': 60.0, 'aqi': 100.0, 'heat_index': 80.0}
+
+
+def hour_grid(start, end):
+    return pd.date_range(start, end, freq=GRID, inclusive='left')
+
+
+# Hourly means (a Series indexed by hour start) of a metric from a frame with a 'time' column
+def hourly_means(df, metric):
+    if df.empty or metric not in df.columns:
+        return pd.Series(dtype='float64')
+    return df.set_index('time')[metric].resample(GRID).mean()
+
+
+# Matrix of hourly means, one column per series, on the rows of `index`; hours outside the
+# index are dropped
+def aligned_matrix(series_list, index):
+    matrix = np.full((len(index), len(series_list)), np.nan)
+    for j, series in enumerate(series_list):
+        if series.empty:
+            continue
+        rows = index.get_indexer(series.index)
+        keep = rows >= 0
+        matrix[rows[keep], j] = series.to_numpy(dtype='float64')[keep]
+    return matrix
+
+
+# Per-device statistics (one row per column of the matrix)
+def device_stats(matrix, index, devices, threshold):
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=0)
+    has_data = counts > 0
+    sums = np.where(present, matrix, 0.0).sum(axis=0)
+    highest = np.where(present, matrix, -np.inf)
+    lowest = np.where(present, matrix, np.inf)
+    worst = highest.argmax(axis=0) if len(index) else np.zeros(len(devices), dtype=int)
+    stats = pd.DataFrame({
+        'device': devices,
+        'mean': np.where(has_data, sums / np.maximum(counts, 1), np.nan),
+        'min': np.where(has_data, lowest.min(axis=0, initial=np.inf), np.nan),
+        'max': np.where(has_data, highest.max(axis=0, initial=-np.inf), np.nan),
+        'coverage': counts / len(index) if len(index) else np.zeros(len(devices)),
+        'hours_over': (matrix > threshold).sum(axis=0),
+    })
+    stats['worst_hour'] = index[worst].where(has_data) if len(index) else pd.NaT
+    return stats.sort_values(['hours_over', 'mean'], ascending=False, ignore_index=True)
+
+
+# Average consecutive rows into at most max_rows buckets; returns (matrix, bucket starts)
+def coarsen(matrix, index, max_rows=MAX_COLUMNS):
+    factor = -(-len(index) // max_rows) if len(index) else 1
+    if factor <= 1:
+        return matrix, index
+    rows = -(-len(index) // factor)
+    padded = np.full((rows * factor, matrix.shape[1]), np.nan)
+    padded[:len(index)] = matrix
+    blocks = padded.reshape(rows, factor, matrix.shape[1])
+    present = ~np.isnan(blocks)
+    counts = present.sum(axis=1)
+    means = np.where(present, blocks, 0.0).sum(axis=1) / np.maximum(counts, 1)
+    return np.where(counts > 0, means, np.nan), index[::factor]
+
+
+# Heatmap of the devices (rows) over time, with their hours over the threshold alongside
+def comparison_heatmap(matrix, index, devices, stats, metric, threshold):
+    order = list(stats['device'])[::-1]  # most hours over the threshold at the top
+    columns = [devices.index(d) for d in order]
+    z, x = coarsen(matrix[:, columns], index)
+    hours_over = stats.set_index('device').loc[order, 'hours_over']
+
+    fig = make_subplots(rows=1, cols=2, shared_yaxes=True, column_widths=[0.82, 0.18], horizontal_spacing=0.02)
+    # Wall-clock times, which is what plotly shows for tz-aware ones; as datetime64 they stay a
+    # numpy array instead of becoming a list of datetime objects
+    fig.add_trace(go.Heatmap(z=z.T, x=x.tz_localize(None).to_numpy(), y=order, colorscale='YlOrRd',
+                             colorbar=dict(title=metric, x=0.8), hoverongaps=False), row=1, col=1)
+    fig.add_trace(go.Bar(x=hours_over.values, y=order, orientation='h', name=f'Hours > {threshold:g}',
+                         marker_color='firebrick', showlegend=False), row=1, col=2)
+    fig.update_layout(title=f"Hourly {metric} by device", template='plotly_white',
+                      height=max(300, 40 * len(order) + 150))
+    fig.update_xaxes(title_text="Time", row=1, col=1)
+    fig.update_xaxes(title_text=f"Hours > {threshold:g}", row=1, col=2)
+    return fig
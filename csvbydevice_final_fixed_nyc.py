@@ -1,7 +1,16 @@
+import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import re
 from dateutil import parser
+from storage import (append_device_rows, parse_device_csv, parse_device_csv_from, store_is_current,
+                     update_partitions, write_csv_atomic, write_partitions)
+from rollups import rollups_are_current, update_rollups, write_rollups
+from catalog import describe_device, file_sha256, update_catalog
+from timeparse import parse_times
 
 # Define your input and output directories
 input_dirs = {
@@ -10,9 +19,30 @@ input_dirs = {
     'purpleair': 'C:\\Users\\Angy\\Documents\\iaq_ufd_nyc\\data_unprocessed\\purpleair_unprocessed'
 }
 output_dir = 'C:\\Users\\Angy\\Documents\\iaq_ufd_nyc\\project\\data_processed'
+# Columnar copy of the processed data and its hourly/daily rollups, read by the dashboard
+store_dir = os.path.join(os.path.dirname(output_dir), 'data_store')
+rollup_dir = os.path.join(os.path.dirname(output_dir), 'data_rollups')
+# Record of the source files already ingested, used by --incremental
+manifest_file = os.path.join(os.path.dirname(output_dir), 'ingest_manifest.json')
 
-# Ensure the output directory exists
-os.makedirs(output_dir, exist_ok=True)
+# Point the script at another layout, e.g. the dashboard's own directories (see refresh.py).
+# raw_dirs maps each family to its input directory.
+def configure(raw_dirs, processed_dir):
+    global input_dirs, output_dir, store_dir, rollup_dir, manifest_file
+    input_dirs = dict(raw_dirs)
+    output_dir = processed_dir
+    store_dir = os.path.join(os.path.dirname(output_dir), 'data_store')
+    rollup_dir = os.path.join(os.path.dirname(output_dir), 'data_rollups')
+    manifest_file = os.path.join(os.path.dirname(output_dir), 'ingest_manifest.json')
+
+# Rebuild the partitioned store and rollup tiers for a device from its freshly written CSV
+def refresh_derived(device, output_file):
+    try:
+        df = parse_device_csv(output_file)
+        write_partitions(store_dir, device, df, source_path=output_file)
+        write_rollups(rollup_dir, device, df, source_path=output_file)
+    except Exception as e:
+        print(f"[WARN] Could not update store/rollups for {device}: {e}")
 
 # Function to convert temperature from Celsius to Fahrenheit
 def celsius_to_fahrenheit(tempC):
@@ -28,13 +58,9 @@ from pytz import timezone
 
 def convert_to_eastern_time(time_column, device_type):
     try:
-        if device_type == 'awair':
-            dt_series = pd.to_datetime(time_column, errors='coerce')
-            dt_series = dt_series.dt.tz_localize('America/New_York', ambiguous='NaT', nonexistent='shift_forward')
-        else:
-            dt_series = pd.to_datetime(time_column, errors='coerce', utc=True)
-            dt_series = dt_series.dt.tz_convert('America/New_York')
-        return dt_series
+        # Awair exports are Eastern wall-clock time; the others are UTC or carry an offset
+        naive_tz = 'America/New_York' if device_type == 'awair' else None
+        return parse_times(time_column, naive_tz=naive_tz, tz='America/New_York')
     except Exception as e:
         print(f"[ERROR] Converting {device_type} to Eastern time: {e}")
         return pd.Series([pd.NaT] * len(time_column))
@@ -62,117 +88,255 @@ def standardize_purpleair_columns(df):
     df.rename(columns=column_mapping, inplace=True)
     return df
 
-# Dictionary to store data by device
-device_data = {}
-
-# Process MCCI files (assumed to be in UTC)
-for file in os.listdir(input_dirs['mcci']):
-    if file.endswith('.csv'):
-        file_path = os.path.join(input_dirs['mcci'], file)
-        data = pd.read_csv(file_path)
-        
-        # Convert the temperature column to Fahrenheit if needed
-        if 'tempC' in data.columns:
-            data['tempF'] = data['tempC'].apply(celsius_to_fahrenheit)
-            data.drop(columns=['tempC'], inplace=True)
-        
-        # Convert the time column to Eastern Time from UTC
-        data['time'] = convert_to_eastern_time(data['time'], 'mcci')
-        
-        # Filter out rows where 'time' is invalid (NaT)
-        data = data[data['time'].notna()]
-        
-        # Ensure there is a 'device' column in the data
-        if 'device' not in data.columns:
-            print(f"No 'device' column found in file: {file}")
-            continue
-        
-        # Group data by device and append to the device_data dictionary
-        for device, device_df in data.groupby('device'):
-            if device not in device_data:
-                device_data[device] = []
-            device_data[device].append(device_df)
-
-# Consolidate data for each MCCI device and save to CSV
-for device, data_list in device_data.items():
+# Read one MCCI export (assumed to be in UTC); returns {device: rows}
+def read_mcci_file(file_path):
+    data = pd.read_csv(file_path)
+
+    # Convert the temperature column to Fahrenheit if needed
+    if 'tempC' in data.columns:
+        data['tempF'] = celsius_to_fahrenheit(pd.to_numeric(data['tempC'], errors='coerce'))
+        data.drop(columns=['tempC'], inplace=True)
+
+    # Convert the time column to Eastern Time from UTC
+    data['time'] = convert_to_eastern_time(data['time'], 'mcci')
+
+    # Filter out rows where 'time' is invalid (NaT)
+    data = data[data['time'].notna()]
+
+    # Ensure there is a 'device' column in the data
+    if 'device' not in data.columns:
+        print(f"No 'device' column found in file: {os.path.basename(file_path)}")
+        return {}
+
+    return {device: device_df for device, device_df in data.groupby('device')}
+
+# Read one PurpleAir export (includes timezone offset)
+def read_purpleair_file(file_path):
+    base_name = '88439'  # Adjust this as needed
+    data = pd.read_csv(file_path)
+
+    # Standardize column names
+    data = standardize_purpleair_columns(data)
+
+    # Convert the time column to Eastern Time (already includes timezone)
+    data['time'] = convert_to_eastern_time(data['time'], 'purpleair')
+
+    # Filter out rows where 'time' is invalid (NaT)
+    return {base_name: data[data['time'].notna()]}
+
+# Read one Awair export (in Eastern Time, no explicit timezone)
+def read_awair_file(file_path):
+    base_name = re.sub(r'\(\d+\)', '', os.path.splitext(os.path.basename(file_path))[0]).strip()
+    data = pd.read_csv(file_path)
+
+    # Standardize column names
+    data = standardize_awair_columns(data)
+
+    # Convert the time column to Eastern Time
+    data['time'] = convert_to_eastern_time(data['time'], 'awair')
+
+    # Filter out rows where 'time' is invalid (NaT)
+    return {base_name: data[data['time'].notna()]}
+
+# Source families in processing order, with their labels and file readers
+sources = [
+    ('mcci', 'MCCI', read_mcci_file),
+    ('purpleair', 'PurpleAir', read_purpleair_file),
+    ('awair', 'Awair', read_awair_file),
+]
+labels = {family: label for family, label, _ in sources}
+readers = {family: read_file for family, _, read_file in sources}
+
+def load_manifest(path):
+    try:
+        with open(path) as fid:
+            return json.load(fid)
+    except FileNotFoundError:
+        return {'files': {}, 'devices': {}}
+
+def save_manifest(path, manifest):
+    with open(path + '.tmp', 'w') as fid:
+        json.dump(manifest, fid, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# A source file is skipped in incremental mode when its size and hash match the manifest. The
+# hash is only computed when the modification time differs from the recorded one (e.g. after a
+# checkout), and a match records the new time so the next run does not hash it again.
+def already_ingested(manifest, file_path):
+    entry = manifest['files'].get(file_path)
+    stat = os.stat(file_path)
+    if entry is None or entry['size'] != stat.st_size:
+        return False
+    if entry.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if entry['sha256'] != file_sha256(file_path):
+        return False
+    entry['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+# Merge only the new rows into an existing output file. The rewritten region starts at local
+# midnight of the earliest new row, so the store partitions and rollup buckets that cover it
+# can be refreshed from just that region.
+def append_device_output(device, combined_data, output_file):
+    since = combined_data['time'].min().normalize()
+    store_current = store_is_current(store_dir, device, output_file)
+    rollups_current = rollups_are_current(rollup_dir, device, output_file)
+
+    offset = append_device_rows(output_file, combined_data, since)
+
+    if not (store_current and rollups_current):
+        refresh_derived(device, output_file)
+        return
+    try:
+        tail = parse_device_csv_from(output_file, offset)
+        update_partitions(store_dir, device, tail, since, source_path=output_file)
+        update_rollups(rollup_dir, device, tail, since, source_path=output_file)
+    except Exception as e:
+        print(f"[WARN] Incremental store/rollup update failed for {device}, rebuilding: {e}")
+        refresh_derived(device, output_file)
+
+# Consolidate the new data for a device and save it to its processed CSV
+def write_device_output(family, device, data_list, incremental):
     combined_data = pd.concat(data_list).drop_duplicates(subset=['time']).sort_values(by='time')
-    
-    # Check if the processed file for this device already exists
+    if combined_data.empty:
+        return None
     output_file = os.path.join(output_dir, f'{device}.csv')
-    if os.path.exists(output_file):
-        existing_data = pd.read_csv(output_file)
-        existing_data['time'] = pd.to_datetime(existing_data['time'], errors='coerce', utc=True)
-        existing_data['time'] = existing_data['time'].dt.tz_convert('America/New_York')
-        combined_data = pd.concat([existing_data, combined_data]).drop_duplicates(subset=['time']).sort_values(by='time')
-    
-    # Save the combined data to the file
-    combined_data.to_csv(output_file, index=False)
-    print(f"Processed and updated MCCI file saved: {output_file}")
-
-# Process PurpleAir files (includes timezone offset)
-purple_files = {}
-for file in os.listdir(input_dirs['purpleair']):
-    if file.endswith('.csv'):
-        file_path = os.path.join(input_dirs['purpleair'], file)
-        base_name = '88439'  # Adjust this as needed
-        
-        if base_name not in purple_files:
-            purple_files[base_name] = []
-        
-        data = pd.read_csv(file_path)
-        
-        # Standardize column names
-        data = standardize_purpleair_columns(data)
-        
-        # Convert the time column to Eastern Time (already includes timezone)
-        data['time'] = convert_to_eastern_time(data['time'], 'purpleair')
-        
-        # Filter out rows where 'time' is invalid (NaT)
-        data = data[data['time'].notna()]
-        
-        purple_files[base_name].append(data)
-
-# Combine and save PurpleAir data
-for base_name, data_list in purple_files.items():
-    combined_data = pd.concat(data_list).drop_duplicates(subset=['time']).sort_values(by='time')
-    
-    # Save the combined data to the file
-    output_file = os.path.join(output_dir, f'{base_name}.csv')
-    combined_data.to_csv(output_file, index=False)
-    print(f"Processed and updated PurpleAir file saved: {output_file}")
-
-# Process Awair files (in Eastern Time, no explicit timezone)
-awair_files = {}
-for file in os.listdir(input_dirs['awair']):
-    if file.endswith('.csv'):
-        file_path = os.path.join(input_dirs['awair'], file)
-        base_name = re.sub(r'\(\d+\)', '', os.path.splitext(file)[0]).strip()
-        
-        if base_name not in awair_files:
-            awair_files[base_name] = []
-        
-        data = pd.read_csv(file_path)
-        
-        # Standardize column names
-        data = standardize_awair_columns(data)
-        
-        # Convert the time column to Eastern Time
-        data['time'] = convert_to_eastern_time(data['time'], 'awair')
-        
-        # Filter out rows where 'time' is invalid (NaT)
-        data = data[data['time'].notna()]
-        
-        awair_files[base_name].append(data)
-
-# Combine and save Awair data
-for base_name, data_list in awair_files.items():
-    combined_data = pd.concat(data_list).drop_duplicates(subset=['time']).sort_values(by='time')
-    
-    # Save the combined data to the file
-    output_file = os.path.join(output_dir, f'{base_name}.csv')
-    combined_data.to_csv(output_file, index=False)
-    print(f"Processed and updated Awair file saved: {output_file}")
 
-print("Processing complete. Files saved in:", output_dir)
+    if incremental and os.path.exists(output_file):
+        append_device_output(device, combined_data, output_file)
+    else:
+        # MCCI exports overlap earlier ones, so a full run merges them with the existing file;
+        # PurpleAir and Awair files are rebuilt from all of their exports
+        if family == 'mcci' and os.path.exists(output_file):
+            existing_data = pd.read_csv(output_file)
+            existing_data['time'] = parse_times(existing_data['time'], tz='America/New_York')
+            combined_data = pd.concat([existing_data, combined_data]).drop_duplicates(subset=['time']).sort_values(by='time')
+
+        # Save the combined data to the file; the dashboard may be reading it
+        write_csv_atomic(combined_data, output_file)
+        refresh_derived(device, output_file)
+    return combined_data['time'].max()
+
+# Worker processes inherit the configured directories, which matters when they are spawned
+# rather than forked (Windows) or when the paths were changed after import
+def init_worker(dirs):
+    global input_dirs, output_dir, store_dir, rollup_dir
+    input_dirs, output_dir, store_dir, rollup_dir = dirs
+
+# Run fn over tasks in a process pool (or inline for a single worker), yielding results as they finish
+def run_tasks(fn, tasks, workers):
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield fn(task)
+        return
+    dirs = (input_dirs, output_dir, store_dir, rollup_dir)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(dirs,)) as pool:
+        yield from pool.map(fn, tasks)
+
+# Worker task: parse and normalize one source file
+def parse_source_file(task):
+    family, file_path = task
+    started = time.perf_counter()
+    frames = readers[family](file_path)
+    max_times = [df['time'].max() for df in frames.values() if not df.empty]
+    stat = os.stat(file_path)
+    info = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(file_path),
+        'max_time': max(max_times).isoformat() if max_times else None,
+    }
+    return family, file_path, frames, info, time.perf_counter() - started
+
+# Worker task: merge and write one device's output, and describe it for the catalog
+def write_device_task(task):
+    family, device, data_list, incremental = task
+    started = time.perf_counter()
+    max_time = write_device_output(family, device, data_list, incremental)
+    entry = None
+    if max_time is not None:
+        try:
+            entry = describe_device(os.path.join(output_dir, f'{device}.csv'), device)
+        except Exception as e:
+            print(f"[WARN] Could not describe {device} for the catalog: {e}")
+    return family, device, max_time, entry, time.perf_counter() - started
+
+def report_timings(timings):
+    print("[TIMING] stage      wall(s)  worker(s)  items")
+    for stage, (wall, busy, items) in timings.items():
+        print(f"[TIMING] {stage:<10} {wall:7.2f}  {busy:9.2f}  {items:5d}")
+
+# Process the raw exports into the per-device outputs; returns the devices that were updated
+def ingest(incremental=False, workers=os.cpu_count() or 1):
+    timings = {}
+
+    # Ensure the output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(manifest_file)
+    # Entries of source files that have since been removed can never be skipped again
+    manifest['files'] = {path: entry for path, entry in manifest['files'].items() if os.path.exists(path)}
+
+    # Stage 1: find the source files that need processing
+    started = time.perf_counter()
+    tasks = []
+    for family, _, _ in sources:
+        for file in sorted(os.listdir(input_dirs[family])):
+            if not file.endswith('.csv'):
+                continue
+            file_path = os.path.join(input_dirs[family], file)
+            if incremental and already_ingested(manifest, file_path):
+                continue
+            tasks.append((family, file_path))
+    timings['scan'] = (time.perf_counter() - started, 0.0, len(tasks))
+
+    # Stage 2: parse files in the worker pool and group the rows by device in the parent
+    started = time.perf_counter()
+    busy = 0.0
+    device_data = {}
+    ingested = {}
+    for family, file_path, frames, info, seconds in run_tasks(parse_source_file, tasks, workers):
+        for device, device_df in frames.items():
+            device_data.setdefault((family, device), []).append(device_df)
+        ingested[file_path] = info
+        busy += seconds
+    timings['parse'] = (time.perf_counter() - started, busy, len(tasks))
+
+    # Stage 3: write each device's output concurrently
+    started = time.perf_counter()
+    busy = 0.0
+    write_tasks = [(family, device, data_list, incremental)
+                   for (family, device), data_list in device_data.items()]
+    catalog_entries = {}
+    for family, device, max_time, entry, seconds in run_tasks(write_device_task, write_tasks, workers):
+        busy += seconds
+        if max_time is None:
+            continue
+        if entry is not None:
+            catalog_entries[device] = entry
+        previous = manifest['devices'].get(device, {}).get('max_time')
+        if previous is not None:
+            max_time = max(max_time, pd.Timestamp(previous))
+        manifest['devices'][device] = {'family': family, 'max_time': max_time.isoformat()}
+        print(f"Processed and updated {labels[family]} file saved: {os.path.join(output_dir, f'{device}.csv')}")
+    timings['write'] = (time.perf_counter() - started, busy, len(write_tasks))
+
+    # Files are recorded only once their rows are safely written
+    manifest['files'].update(ingested)
+    save_manifest(manifest_file, manifest)
+    update_catalog(output_dir, catalog_entries)
+
+    print("Processing complete. Files saved in:", output_dir)
+    report_timings(timings)
+    return sorted(catalog_entries)
 
+def main():
+    arg_parser = argparse.ArgumentParser(description='Process raw MCCI, PurpleAir and Awair exports into per-device CSVs')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='skip source files already in the manifest and append only new rows')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='worker processes for parsing and writing (default: CPU count)')
+    args = arg_parser.parse_args()
+    ingest(args.incremental, args.workers)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Memory budget for cached frames, in megabytes (override with DATA_CACHE_MB)
+DEFAULT_BUDGET_MB = int(os.environ.get('DATA_CACHE_MB', 256))
+
+
+# A file's version is its modification time and size; either changing invalidates the cache entry
+def file_version(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# LRU cache of parsed frames keyed by source file, bounded by total frame memory
+class FrameCache:
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (version, frame, nbytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, key, path, loader):
+        version = file_version(path)
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry
+
+        # Only one thread parses a given file; the others wait and reuse its result
+        with self._load_lock(key):
+            entry = self._lookup(key, version, count=False)
+            if entry is not None:
+                return entry
+            with self._lock:
+                self.misses += 1
+            frame = loader(path)
+            self._store(key, version, frame)
+            return frame
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._total_bytes = 0
+            elif key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[2]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _lookup(self, key, version, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def _store(self, key, version, frame):
+        nbytes = frame_nbytes(frame)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[2]
+            # A frame larger than the whole budget is returned to the caller but not kept
+            if nbytes > self.budget_bytes:
+                print(f"[WARN] Frame for {key} ({nbytes} bytes) exceeds cache budget; not cached")
+                return
+            self._entries[key] = (version, frame, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.budget_bytes:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_bytes
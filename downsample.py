@@ -0,0 +1,75 @@
+# Server-side decimation of time series before they are sent to the browser.
+#
+# Both methods return the indices of the points to keep, so spikes in the original
+# series stay on the plot:
+#   minmax  keeps the lowest and highest point of every bucket (default)
+#   lttb    Largest-Triangle-Three-Buckets, keeps the visually most significant point per bucket
+#
+# Configure with PLOT_MAX_POINTS (points per trace, default 2000) and PLOT_DECIMATION.
+
+import os
+
+import numpy as np
+
+MAX_POINTS = int(os.environ.get('PLOT_MAX_POINTS', 2000))
+METHOD = os.environ.get('PLOT_DECIMATION', 'minmax')
+
+
+def minmax_indices(y, n_out):
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(n_buckets, size)
+    # Every row holds at least one real value, so nanargmin/nanargmax never see an all-NaN row
+    rows = rows[:-(-n // size)]
+    offsets = np.arange(len(rows)) * size
+    keep = np.concatenate([offsets + np.nanargmin(rows, axis=1),
+                           offsets + np.nanargmax(rows, axis=1),
+                           [0, n - 1]])
+    return np.unique(keep)
+
+
+def lttb_indices(x, y, n_out):
+    n = len(y)
+    if n_out < 3:
+        return np.array([0, n - 1])
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # Interior points are split into n_out - 2 buckets; the first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0] = 0
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) -
+                      (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        keep[i + 1] = prev
+    keep[-1] = n - 1
+    return keep
+
+
+# Indices of at most about max_points points of (x, y) to plot; NaN readings are skipped
+def decimate_indices(x, y, max_points=MAX_POINTS, method=METHOD):
+    y = np.asarray(y, dtype='float64')
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= max_points:
+        return valid
+    if method == 'lttb':
+        picked = lttb_indices(np.asarray(x)[valid], y[valid], max_points)
+    else:
+        picked = minmax_indices(y[valid], max_points)
+    return valid[picked]
+
+
+# Decimate a frame for plotting column y against the 'time' column
+def decimate_frame(df, y, max_points=MAX_POINTS, method=METHOD):
+    x = df['time'].astype('int64').to_numpy()
+    return df.iloc[decimate_indices(x, df[y].to_numpy(), max_points, method)]
@@ -0,0 +1,122 @@
+# Bulk export of device data, served by the /download route in app.py:
+#
+#     /download?device=<id>[&device=<id>...]&start=YYYY-MM-DD&end=YYYY-MM-DD
+#               [&metrics=pm.2.5,heat_index][&resolution=raw|hourly|daily][&format=csv|parquet]
+#
+# Rows are in [start, end] (dates taken as midnight Eastern time, as in the dashboard), one table
+# for all devices with a 'device' column. Raw exports have one column per metric; hourly and daily
+# exports have <metric>_mean, _min, _max and _count, as in the rollup tiers.
+#
+# The output is produced one device-month at a time and each piece is sent as soon as it is
+# encoded (a CSV block, or a Parquet row group), so memory use is bounded by one month of one
+# device whatever the size of the export.
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from rollups import ROLLUP_METRICS, STATS
+
+TIMEZONE = 'America/New_York'
+RESOLUTIONS = ['raw', 'hourly', 'daily']
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+METRICS = ROLLUP_METRICS
+
+
+# Calendar-month pieces of [start, end]: (piece start, piece end, is last); only the last
+# piece includes its end
+def month_windows(start, end):
+    bounds = [start] + [t for t in pd.date_range(start, end, freq='MS') if start < t < end] + [end]
+    return [(lo, hi, i == len(bounds) - 2) for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+
+def export_columns(metrics, resolution):
+    if resolution == 'raw':
+        return ['time', 'device'] + metrics
+    return ['time', 'device'] + [f'{m}_{stat}' for m in metrics for stat in STATS]
+
+
+# Give every piece the same columns and dtypes, so the pieces form one table: values float64,
+# counts int64 (0 where a device does not report the metric)
+def conform(df, columns):
+    df = df.reindex(columns=columns)
+    counts = [c for c in columns if c.endswith('_count')]
+    values = [c for c in columns[2:] if c not in counts]
+    df[counts] = df[counts].fillna(0).astype('int64')
+    df[values] = df[values].astype('float64')
+    return df
+
+
+# The export as a sequence of frames, one per device and month. load(device, resolution, start,
+# end, metrics) returns that device's rows (with a 'time' column) in [start, end]; rows at a
+# month piece's end are left to the next piece.
+def export_frames(devices, start, end, metrics, resolution, load):
+    columns = export_columns(metrics, resolution)
+    for device in devices:
+        for lo, hi, last in month_windows(start, end):
+            df = load(device, resolution, lo, hi, metrics)
+            if df.empty:
+                continue
+            if not last:
+                df = df[df['time'] < hi]
+            yield conform(df.assign(device=device), columns)
+
+
+# The header goes out with the first frame, so the first chunk is only produced once the
+# first frame has loaded
+def csv_chunks(frames, columns):
+    header = ','.join(columns) + '\n'
+    for df in frames:
+        yield header + df.to_csv(index=False, header=False)
+        header = ''
+    if header:
+        yield header
+
+
+# Write-only file object that hands back what has been written since the last call, for
+# streaming a ParquetWriter's output. It reports the total position, which the writer records
+# in the file footer.
+class ChunkSink:
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema(columns):
+    fields = [pa.field('time', pa.timestamp('ns', tz=TIMEZONE)), pa.field('device', pa.string())]
+    fields += [pa.field(c, pa.int64() if c.endswith('_count') else pa.float64()) for c in columns[2:]]
+    return pa.schema(fields)
+
+
+# One row group per frame
+def parquet_chunks(frames, columns):
+    schema = parquet_schema(columns)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for df in frames:
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
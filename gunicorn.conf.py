@@ -0,0 +1,65 @@
+# gunicorn settings for the dashboard (see wsgi.py).
+#
+#     PORT             port to bind (default 5000, as app.py)
+#     WEB_CONCURRENCY  worker processes (default: one per CPU, at least 2)
+#     WEB_THREADS      threads per worker (default 4)
+#     DATA_WATCH_SECONDS  how often each worker checks for refreshed data (default 30; 0 disables)
+#     REFRESH_INTERVAL    run refresh.py next to the server every interval, e.g. '15m' (default: off)
+#     REFRESH_LOOKBACK    MCCI window each refresh fetches (default '1d')
+#     FAST_START          set to 1 to bind the port before importing the app (see below)
+
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+
+bind = f"0.0.0.0:{int(os.environ.get('PORT', 5000))}"
+workers = int(os.environ.get('WEB_CONCURRENCY', max(multiprocessing.cpu_count(), 2)))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app, and load the data, once in the master before forking. Both happen before
+# the port is bound, so a waking dyno answers nothing until they are done; with FAST_START=1
+# the master binds first, each worker imports the app itself and loads the data in the
+# background, and the first page is served as soon as a worker has imported the app. Workers
+# then hold their own copies of the data rather than sharing the master's.
+fast_start = os.environ.get('FAST_START') == '1'
+preload_app = not fast_start
+
+# Parsing a large CSV on a cache miss can take a while
+timeout = 120
+accesslog = '-'
+
+
+# Each worker watches for data written by refresh.py and loads it in the background
+def post_worker_init(worker):
+    from app import start_data_watcher, start_warmup
+    if fast_start:
+        start_warmup()
+    start_data_watcher()
+
+
+# refresh.py runs as a child of the master, on the same machine (and so the same files) as
+# the workers, for as long as the server does
+refresher = None
+
+
+def when_ready(server):
+    global refresher
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    if fast_start:
+        # wsgi.py builds stale store partitions and rollups before forking; with FAST_START a
+        # child builds them once the port is bound, and the workers read the CSVs until then
+        python = shlex.quote(sys.executable)
+        subprocess.Popen(f'{python} storage.py migrate --stale && {python} rollups.py --stale', shell=True, cwd=base_dir)
+    interval = os.environ.get('REFRESH_INTERVAL')
+    if interval:
+        script = os.path.join(base_dir, 'refresh.py')
+        refresher = subprocess.Popen([sys.executable, script, '--interval', interval,
+                                      '--lookback', os.environ.get('REFRESH_LOOKBACK', '1d')])
+
+
+def on_exit(server):
+    if refresher is not None:
+        refresher.terminate()
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Rothfusz regression coefficients (NWS heat index equation)
+C1 = -42.379
+C2 = 2.04901523
+C3 = 10.14333127
+C4 = -0.22475541
+C5 = -6.83783e-3
+C6 = -5.481717e-2
+C7 = 1.22874e-3
+C8 = 8.5282e-4
+C9 = -1.99e-6
+
+
+def _rothfusz(temp_f, rh):
+    return (C1 + (C2 * temp_f) + (C3 * rh) + (C4 * temp_f * rh) +
+            (C5 * temp_f ** 2) + (C6 * rh ** 2) +
+            (C7 * temp_f ** 2 * rh) + (C8 * temp_f * rh ** 2) +
+            (C9 * temp_f ** 2 * rh ** 2))
+
+
+def _steadman(temp_f, rh):
+    return 0.5 * (temp_f + 61.0 + ((temp_f - 68.0) * 1.2) + (rh * 0.094))
+
+
+# Heat index in °F for a single temperature (°F) and relative humidity (%)
+def calculate_heat_index(temp_f, rh):
+    heat_index = _rothfusz(temp_f, rh)
+    if temp_f < 80 or rh < 40:
+        heat_index = _steadman(temp_f, rh)
+    elif rh < 13 and 80 <= temp_f <= 112:
+        adjustment = ((13 - rh) / 4) * ((17 - abs(temp_f - 95)) / 17) ** 0.5
+        heat_index -= adjustment
+    elif rh > 85 and 80 <= temp_f <= 87:
+        adjustment = ((rh - 85) / 10) * ((87 - temp_f) / 5)
+        heat_index += adjustment
+    return heat_index
+
+
+# Array version of calculate_heat_index; takes arrays or Series and returns a float64 ndarray.
+# The branches are evaluated in the same order as the scalar version, so every element takes
+# the same branch (NaN inputs fall through to the plain regression) and agrees with it to
+# floating-point rounding.
+def calculate_heat_index_array(temp_f, rh):
+    temp_f = np.asarray(temp_f, dtype='float64')
+    rh = np.asarray(rh, dtype='float64')
+    heat_index = _rothfusz(temp_f, rh)
+
+    simple = (temp_f < 80) | (rh < 40)
+    low_rh = ~simple & (rh < 13) & (temp_f >= 80) & (temp_f <= 112)
+    high_rh = ~simple & ~low_rh & (rh > 85) & (temp_f >= 80) & (temp_f <= 87)
+
+    heat_index = np.where(simple, _steadman(temp_f, rh), heat_index)
+    if low_rh.any():
+        t, r = temp_f[low_rh], rh[low_rh]
+        heat_index[low_rh] -= ((13 - r) / 4) * ((17 - np.abs(t - 95)) / 17) ** 0.5
+    if high_rh.any():
+        t, r = temp_f[high_rh], rh[high_rh]
+        heat_index[high_rh] += ((r - 85) / 10) * ((87 - t) / 5)
+    return heat_index
@@ -0,0 +1,186 @@
+# Fetch MCCI data from InfluxDB without shelling out to curl.
+#
+# Builds the same query as get-influxdb-data-ccny.sh, splits the requested time range into
+# windows and fetches them concurrently over one pooled HTTP session. Each window's response
+# is streamed straight through influx_stream into its own part file, so an interrupted run
+# resumes with the windows that are still missing. The parts are then joined into one CSV in
+# the layout InfluxDBjson2csv.py has always written.
+#
+# Example (last 7 days, one window per day, 4 concurrent requests):
+#     >> python influx_fetch.py -u user:password -t 7d --workers 4 -o newdata.csv
+
+import argparse
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as StreamError
+from urllib3.util.retry import Retry
+
+from influx_stream import convert
+
+# Defaults from get-influxdb-data-ccny.sh
+INFLUXDB_SERVER = 'www.iaqnyc.net'
+INFLUXDB_DB = 'iaqnyc'
+INFLUXDB_SERIES = 'EnvironmentalData'
+INFLUXDB_USER = 'nobody'
+INFLUXDB_QUERY_VARS = 'aqi,TVOC,dust.0.3,dust.0.5,dust.1.0,dust.2.5,dust.5,dust.10,pm.1.0,pm.2.5,pm.10,tempC,rh,tDewC,vBat,boot'
+INFLUXDB_QUERY_GROUP = 'time(1ms), "devID"'
+INFLUXDB_QUERY_FILL = 'none'
+
+CHUNK_ROWS = 10000
+ATTEMPTS = 3
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+# Same expansion as _expandquery: a bare name becomes mean("name") as "name",
+# anything else (e.g. 'expr as "label"') is passed through unchanged
+def expand_query_vars(query_vars):
+    specs = query_vars.split(',')
+    return ','.join(f'mean("{spec}") as "{spec}"' if re.fullmatch(r'[a-zA-Z0-9_.-]+', spec) else spec
+                    for spec in specs)
+
+
+def build_query(where, query_vars=INFLUXDB_QUERY_VARS, series=INFLUXDB_SERIES,
+                group=INFLUXDB_QUERY_GROUP, fill=INFLUXDB_QUERY_FILL):
+    fill_clause = f' fill({fill})' if fill != '-' else ''
+    return f'SELECT {expand_query_vars(query_vars)} from "{series}" where {where} GROUP BY {group}{fill_clause}'
+
+
+def parse_time(value):
+    return datetime.strptime(value, TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+# Split [start, end) into consecutive windows of at most `step`
+def time_windows(start, end, step):
+    windows = []
+    while start < end:
+        window_end = min(start + step, end)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def window_where(start, end, where=None):
+    clause = f"time >= '{start.strftime(TIME_FORMAT)}' AND time < '{end.strftime(TIME_FORMAT)}'"
+    return f'({where}) AND {clause}' if where else clause
+
+
+def make_session(user=INFLUXDB_USER, workers=4, retries=5):
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    username, _, password = user.partition(':')
+    session.auth = (username, password)
+    return session
+
+
+def query_url(server=INFLUXDB_SERVER):
+    return f'https://{server}/influxdb:8086/query'
+
+
+# Fetch one window and stream it into part_path; the part only appears once it is complete.
+# The body is read from response.raw, so a connection dropped mid-stream surfaces as a urllib3
+# error rather than a requests one; an 'error' entry in the response fails the attempt too.
+def fetch_window(session, url, db, query, part_path, timeout=300):
+    params = {'db': db, 'q': query, 'pretty': 'false', 'chunked': 'true', 'chunk_size': CHUNK_ROWS}
+    last_error = None
+    for attempt in range(ATTEMPTS):
+        try:
+            with session.get(url, params=params, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(part_path + '.tmp', 'w') as csv_fid:
+                    nrows = convert(response.raw, csv_fid, warn_empty=False, strict=True)
+            os.replace(part_path + '.tmp', part_path)
+            return nrows
+        except (requests.RequestException, StreamError, ValueError) as e:
+            last_error = e
+            print(f"[WARN] Window {os.path.basename(part_path)} attempt {attempt + 1} failed: {e}")
+            if os.path.exists(part_path + '.tmp'):
+                os.remove(part_path + '.tmp')
+    raise RuntimeError(f"Could not fetch {os.path.basename(part_path)}: {last_error}")
+
+
+# Concatenate the window parts in time order, keeping the first header only
+def join_parts(part_paths, csv_path):
+    header = None
+    with open(csv_path + '.tmp', 'w') as out:
+        for part_path in part_paths:
+            with open(part_path) as part:
+                part_header = part.readline()
+                if not part_header:
+                    continue
+                if header is None:
+                    header = part_header
+                    out.write(header)
+                elif part_header != header:
+                    print(f"[WARN] {os.path.basename(part_path)} has different columns: {part_header.strip()}")
+                shutil.copyfileobj(part, out)
+    os.replace(csv_path + '.tmp', csv_path)
+
+
+def fetch_csv(csv_path, start, end, window=timedelta(days=1), workers=4, user=INFLUXDB_USER,
+              server=INFLUXDB_SERVER, db=INFLUXDB_DB, url=None, where=None, **query_options):
+    url = url or query_url(server)
+    parts_dir = csv_path + '.parts'
+    os.makedirs(parts_dir, exist_ok=True)
+
+    jobs = []
+    for window_start, window_end in time_windows(start, end, window):
+        name = f"{window_start.strftime('%Y%m%dT%H%M%S')}_{window_end.strftime('%Y%m%dT%H%M%S')}.csv"
+        query = build_query(window_where(window_start, window_end, where), **query_options)
+        jobs.append((query, os.path.join(parts_dir, name)))
+
+    pending = [(query, part_path) for query, part_path in jobs if not os.path.exists(part_path)]
+    if len(pending) < len(jobs):
+        print(f"Resuming: {len(jobs) - len(pending)} of {len(jobs)} windows already fetched")
+
+    with make_session(user, workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fetch_window, session, url, db, query, part_path)
+                   for query, part_path in pending]
+        nrows = sum(future.result() for future in futures)
+    print(f"Fetched {nrows} rows in {len(pending)} windows")
+
+    join_parts([part_path for _, part_path in jobs], csv_path)
+    shutil.rmtree(parts_dir)
+    return csv_path
+
+
+# '7d' / '12h' style look-back, as used by the timelapse setting of the conversion scripts
+def parse_timelapse(timelapse):
+    unit = {'d': 'days', 'h': 'hours'}[timelapse[-1]]
+    return timedelta(**{unit: int(timelapse[:-1])})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch InfluxDB data as CSV in concurrent time windows')
+    parser.add_argument('-o', '--output', required=True, help='CSV file to write')
+    parser.add_argument('-u', '--user', default=INFLUXDB_USER, help='user or user:password')
+    parser.add_argument('-S', '--server', default=INFLUXDB_SERVER)
+    parser.add_argument('-d', '--database', default=INFLUXDB_DB)
+    parser.add_argument('-s', '--series', default=INFLUXDB_SERIES)
+    parser.add_argument('-q', '--vars', default=INFLUXDB_QUERY_VARS)
+    parser.add_argument('-g', '--group', default=INFLUXDB_QUERY_GROUP)
+    parser.add_argument('-f', '--fill', default=INFLUXDB_QUERY_FILL)
+    parser.add_argument('-w', '--where', help='extra where clause, ANDed with the time window')
+    parser.add_argument('--url', help='full /query URL (overrides --server), e.g. for a local server')
+    parser.add_argument('--start', help=f'range start, {TIME_FORMAT}')
+    parser.add_argument('--end', help=f'range end, {TIME_FORMAT} (default: now)')
+    parser.add_argument('-t', '--timelapse', default='1d', help="look-back when --start is not given, e.g. '7d' or '12h'")
+    parser.add_argument('--window', default='1d', help="window size, e.g. '1d' or '6h'")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    end = parse_time(args.end) if args.end else datetime.now(timezone.utc).replace(microsecond=0)
+    start = parse_time(args.start) if args.start else end - parse_timelapse(args.timelapse)
+    fetch_csv(args.output, start, end, window=parse_timelapse(args.window), workers=args.workers,
+              user=args.user, server=args.server, db=args.database, url=args.url, where=args.where,
+              query_vars=args.vars, series=args.series, group=args.group, fill=args.fill)
@@ -0,0 +1,233 @@
+# Streaming conversion of InfluxDB /query JSON results to the device CSV layout.
+#
+# The response is walked incrementally (results[].series[].values[]) instead of being loaded
+# with json.load, so memory stays flat however large the export is. Several `results`
+# entries and chunked responses (one JSON document per chunk, as returned with chunked=true)
+# are handled; rows are written in batches.
+#
+# The CSV matches what InfluxDBjson2csv.py has always produced:
+#     device,<columns...>,
+#     <devID>,<value>,<value>,...,
+#
+# Convert a saved response with:  >> python influx_stream.py data.json data.csv
+
+import argparse
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+BATCH_ROWS = 5000
+WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+
+# Incremental JSON tokenizer over a file object: structural characters are consumed one at a
+# time, and every other value is decoded whole with json's C decoder
+class JsonStream:
+    def __init__(self, fid, chunk_size=CHUNK_SIZE):
+        self.fid = fid
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # Chunks may split a multi-byte UTF-8 character
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _fill(self):
+        chunk = self.fid.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    # Next non-whitespace character without consuming it ('' at end of input)
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof or not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in InfluxDB response, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value ending exactly at the buffer end may be a number cut off mid-chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    # Iterate the members of an array, leaving the stream positioned at each member
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
+
+    # Iterate an array of arrays (InfluxDB's `values`), yielding lists of rows. Each call decodes
+    # every complete row in the buffer with one C-level decode; a row the bulk decode cannot
+    # handle (e.g. a ']' inside a string) is decoded on its own.
+    def row_batches(self):
+        self.expect('[')
+        while True:
+            char = self.peek()
+            if char == ']':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+            last = self.buffer.rfind(']', self.pos)
+            if last < 0:
+                if not self._fill():
+                    raise ValueError("Unterminated values array in InfluxDB response")
+                continue
+            chunk = self.buffer[self.pos:last + 1]
+            text = '[' + chunk + ']'
+            try:
+                rows, end = self.decoder.raw_decode(text)
+            except json.JSONDecodeError:
+                yield [self.value()]
+                continue
+            if end == len(text):
+                # The chunk ended on a row boundary; the array continues
+                self.pos = last + 1
+                yield rows
+            else:
+                # The array closed inside the chunk, at text[end - 1]
+                self.pos += end - 1
+                yield rows
+                return
+
+    # Iterate the keys of an object, leaving the stream positioned at each value
+    def keys(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+
+# An 'error' entry in the response: reported, or raised with strict=True so the caller does
+# not take a failed query for an empty result
+def _query_error(value, strict):
+    if strict:
+        raise ValueError(f"InfluxDB query error: {value}")
+    print(f"[ERROR] InfluxDB query error: {value}")
+
+
+def _iter_series(stream, strict=False):
+    for key in stream.keys():
+        if key != 'series':
+            value = stream.value()
+            if key == 'error':
+                _query_error(value, strict)
+            continue
+        for _ in stream.items():
+            series = {}
+            pending = []
+            for series_key in stream.keys():
+                if series_key != 'values':
+                    series[series_key] = stream.value()
+                elif 'columns' in series:
+                    for rows in stream.row_batches():
+                        yield series, rows
+                else:
+                    # InfluxDB sends columns before values; buffer the rows if it ever does not
+                    pending.extend(stream.value())
+            if pending:
+                yield series, pending
+
+
+# Yield (series, rows) batches for every series, across all results and all chunks
+def iter_row_batches(fid, strict=False):
+    stream = JsonStream(fid)
+    while stream.peek():
+        for key in stream.keys():
+            if key != 'results':
+                value = stream.value()
+                if key == 'error':
+                    _query_error(value, strict)
+                continue
+            for _ in stream.items():
+                yield from _iter_series(stream, strict)
+
+
+# Stream an InfluxDB JSON response from json_fid into csv_fid. Returns the number of rows written.
+# With strict=True an error entry in the response raises ValueError.
+def convert(json_fid, csv_fid, tag='devID', batch_rows=BATCH_ROWS, warn_empty=True, strict=False):
+    header = None
+    columns = None
+    order = None
+    batch = []
+    nrows = 0
+    for series, rows in iter_row_batches(json_fid, strict):
+        if series.get('columns') is not columns:
+            columns = series['columns']
+            if header is None:
+                header = columns
+                csv_fid.write('device,' + ''.join(name + ',' for name in header) + '\n')
+            # Later series with different columns are written in the header's column order
+            order = None if columns == header else [columns.index(name) if name in columns else None for name in header]
+        if order is not None:
+            rows = [[row[i] if i is not None else None for i in order] for row in rows]
+
+        prefix = series.get('tags', {}).get(tag, '') + ','
+        batch.extend(prefix + ','.join(map(str, row)) + ',\n' for row in rows)
+        if len(batch) >= batch_rows:
+            csv_fid.write(''.join(batch))
+            nrows += len(batch)
+            batch.clear()
+
+    if batch:
+        csv_fid.write(''.join(batch))
+        nrows += len(batch)
+    if header is None and warn_empty:
+        print("[WARN] No series found in InfluxDB response")
+    return nrows
+
+
+def convert_file(json_path, csv_path, tag='devID'):
+    with open(json_path, 'rb') as json_fid, open(csv_path, 'w') as csv_fid:
+        return convert(json_fid, csv_fid, tag=tag)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert an InfluxDB JSON response to CSV without loading it into memory')
+    parser.add_argument('json_file')
+    parser.add_argument('csv_file')
+    parser.add_argument('--tag', default='devID', help='series tag holding the device id')
+    args = parser.parse_args()
+    print(f"Wrote {convert_file(args.json_file, args.csv_file, tag=args.tag)} rows to {args.csv_file}")
@@ -0,0 +1,176 @@
+# Lightweight instrumentation for the dashboard, exposed in Prometheus text format.
+#
+#     with timer('load_csv'):            # observe a stage's duration into iaq_stage_seconds
+#         ...
+#     register_callback(name, help, 'counter', fn)   # values read from fn() at scrape time
+#
+# Everything is per process: with several gunicorn workers, each one reports its own numbers.
+#
+# Setting PROFILE_SAMPLING=1 also starts a sampling profiler in each process, which records
+# the stack of every thread each PROFILE_INTERVAL_MS (default 10) milliseconds; the counts
+# are served as collapsed stacks, the input format of flamegraph.pl and speedscope.
+
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # label value -> [count per bucket..., count above the last bucket]
+        self._sums = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, label_value, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._series.get(label_value)
+            if counts is None:
+                counts = self._series[label_value] = [0] * (len(self.buckets) + 1)
+                self._sums[label_value] = 0.0
+            counts[i] += 1
+            self._sums[label_value] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: (list(v), self._sums[k]) for k, v in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels({self.label: label_value, "le": le})} {cumulative}')
+            labels = _format_labels({self.label: label_value})
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+# Metric whose values are read at scrape time; fn returns a number or a list of (labels, value)
+class Callback:
+    def __init__(self, name, help, kind, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[WARN] Metric {self.name} failed: {e}")
+            return lines
+        if not isinstance(values, list):
+            values = [({}, values)]
+        lines.extend(f'{self.name}{_format_labels(labels)} {value}' for labels, value in values)
+        return lines
+
+
+def register_callback(name, help, kind, fn):
+    return Callback(name, help, kind, fn)
+
+
+stage_seconds = Histogram('iaq_stage_seconds', 'Time spent in each stage of the dashboard data path', 'stage')
+request_seconds = Histogram('iaq_request_seconds', 'HTTP request latency by route', 'route')
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(stage, time.perf_counter() - start)
+
+
+# Decorator form of timer, for whole functions
+def timed(stage):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_text():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self.samples.update(stacks)
+
+    # Collapsed stacks ("outer;inner;leaf count" per line); reset clears the counts
+    def collapsed(self, reset=False):
+        with self._lock:
+            text = '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common())
+            if reset:
+                self.samples.clear()
+        return text + '\n'
+
+
+_profiler = None
+_profiler_pid = None
+_profiler_lock = threading.Lock()
+
+
+# The profiler of the current process, started on first use when PROFILE_SAMPLING is set.
+# Threads do not survive fork, so each gunicorn worker starts its own.
+def profiler():
+    global _profiler, _profiler_pid
+    if not os.environ.get('PROFILE_SAMPLING'):
+        return None
+    with _profiler_lock:
+        if _profiler_pid != os.getpid():
+            _profiler = SamplingProfiler(int(os.environ.get('PROFILE_INTERVAL_MS', 10)) / 1000)
+            _profiler_pid = os.getpid()
+        return _profiler
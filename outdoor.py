@@ -0,0 +1,108 @@
+# Outdoor reference series (sensor 88439), shared by every indoor device's views.
+#
+# The outdoor data is resampled once per data version onto a regular GRID (the sensor's own
+# 10-minute cadence) with its heat index computed. Each indoor device is as-of joined against
+# that grid: a reading is paired with the outdoor bucket it falls in, if that bucket has data.
+# The aligned frame carries, for every metric both sensors report,
+#
+#     <metric>            indoor value
+#     <metric>_outdoor    outdoor value for the same bucket
+#     <metric>_diff       indoor - outdoor
+#     <metric>_ratio      indoor / outdoor (NaN where the outdoor value is 0)
+#
+# Both are rebuilt only when the version of the underlying data changes.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from heat_index import calculate_heat_index_array
+
+OUTDOOR_DEVICE = '88439'
+GRID = '10min'
+METRICS = ['pm.2.5', 'tempF', 'rh', 'aqi']
+
+
+def _with_heat_index(df):
+    if 'tempF' in df.columns and 'rh' in df.columns:
+        df = df.assign(heat_index=calculate_heat_index_array(df['tempF'], df['rh']))
+    return df
+
+
+# Outdoor frame (with a 'time' column) resampled to GRID means, empty buckets dropped
+def outdoor_grid(df, grid=GRID):
+    if df.empty:
+        return pd.DataFrame(columns=['time'])
+    metrics = [m for m in METRICS if m in df.columns]
+    resampled = df.set_index('time')[metrics].resample(grid).mean().dropna(how='all')
+    return _with_heat_index(resampled).reset_index()
+
+
+# As-of join of an indoor frame (with a 'time' column) against the outdoor grid
+def align(indoor, grid, tolerance=GRID):
+    metrics = [m for m in METRICS + ['heat_index'] if m in indoor.columns and m in grid.columns]
+    outdoor = grid[['time'] + metrics].rename(columns={m: f'{m}_outdoor' for m in metrics})
+    aligned = pd.merge_asof(indoor[['time'] + metrics].sort_values('time'), outdoor, on='time',
+                            direction='backward', tolerance=pd.Timedelta(tolerance))
+    for m in metrics:
+        outside = aligned[f'{m}_outdoor']
+        aligned[f'{m}_diff'] = aligned[m] - outside
+        aligned[f'{m}_ratio'] = aligned[m] / outside.where(outside != 0, np.nan)
+    return aligned
+
+
+# Rows of a frame with a 'time' column in [start, end], like load_data's .loc[start:end]
+def slice_time(df, start=None, end=None):
+    lo = 0 if start is None else df['time'].searchsorted(start, side='left')
+    hi = len(df) if end is None else df['time'].searchsorted(end, side='right')
+    return df.iloc[lo:hi].reset_index(drop=True)
+
+
+# Holds the outdoor grid and the per-device alignments. `load(device, columns)` returns a
+# device's full frame with a 'time' column; `version(device)` returns a token that changes
+# whenever that device's data does.
+class OutdoorReference:
+    def __init__(self, load, version, max_devices=16):
+        self.load = load
+        self.version = version
+        self.max_devices = max_devices
+        self._grid = None  # (version, frame)
+        self._aligned = OrderedDict()  # device -> (version, frame)
+        self._lock = threading.Lock()
+
+    def grid(self):
+        version = self.version(OUTDOOR_DEVICE)
+        with self._lock:
+            if self._grid is not None and self._grid[0] == version:
+                return self._grid[1]
+            frame = outdoor_grid(self.load(OUTDOOR_DEVICE, METRICS))
+            self._grid = (version, frame)
+            return frame
+
+    def aligned(self, device):
+        version = (self.version(device), self.version(OUTDOOR_DEVICE))
+        with self._lock:
+            entry = self._aligned.get(device)
+            if entry is not None and entry[0] == version:
+                self._aligned.move_to_end(device)
+                return entry[1]
+        grid = self.grid()
+        indoor = _with_heat_index(self.load(device, METRICS))
+        frame = align(indoor, grid) if not indoor.empty else pd.DataFrame()
+        with self._lock:
+            self._aligned[device] = (version, frame)
+            self._aligned.move_to_end(device)
+            while len(self._aligned) > self.max_devices:
+                self._aligned.popitem(last=False)
+        return frame
+
+    # Outdoor grid rows in [start, end]
+    def outdoor(self, start=None, end=None):
+        return slice_time(self.grid(), start, end)
+
+    # Aligned rows of a device in [start, end]
+    def comparison(self, device, start=None, end=None):
+        frame = self.aligned(device)
+        return slice_time(frame, start, end) if not frame.empty else frame
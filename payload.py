@@ -0,0 +1,102 @@
+# Compact per-device data for drawing the metric views in the browser (render mode "client").
+#
+# Sent once when a device is selected; date-range and metric changes are then drawn by the
+# clientside callbacks in assets/clientside.js without a server round trip:
+#
+#     {"device": ..., "metrics": [...], "max_points": ...,
+#      "series":         {metric: {"t": [...], "y": [...], "decimated": bool}}   device readings
+#      "outdoor":        {metric: {"t": [...], "y": [...], "decimated": bool}}   outdoor grid
+#      "comparison":     {"<metric>_diff" | "<metric>_ratio": {"t": [...], "y": [...], "decimated": bool}}
+#      "hourly":         {"t": [...], metric: {"mean": [...], "count": [...]}}
+#      "outdoor_hourly": {"t": [...], metric: {"mean": [...], "count": [...]}}}
+#
+# Series are decimated over the whole history, as the server decimates a range (zooming in
+# still fetches full resolution from the server). The outdoor sensor's data is cut to the
+# device's own span, outside which nothing is drawn. The hourly means and counts are the hourly
+# rollup tier, from which the hour-of-day profile of any range is computed exactly.
+#
+# A short range can hold only a few of the decimated points. The browser then asks for a range
+# payload: "device", "start", "end" and the three series groups, decimated over that range only.
+#
+# Times are epoch milliseconds of the Eastern wall-clock time. Plotly draws numbers on a date
+# axis as UTC, so they show the same local times as the server-rendered figures.
+
+import numpy as np
+import pandas as pd
+
+from downsample import MAX_POINTS, decimate_frame
+from outdoor import slice_time
+
+DECIMALS = 3
+
+
+def wall_clock_ms(times):
+    if hasattr(times, 'dt'):
+        times = times.dt.tz_localize(None)
+    else:
+        times = times.tz_localize(None)
+    return (np.asarray(times, dtype='datetime64[ms]').astype('int64')).tolist()
+
+
+def _values(values):
+    return np.round(np.asarray(values, dtype='float64'), DECIMALS).tolist()
+
+
+# Decimated readings of one column of a frame with a 'time' column
+def series_payload(df, column):
+    points = df[['time', column]].dropna()
+    if points.empty:
+        return {'t': [], 'y': [], 'decimated': False}
+    kept = decimate_frame(points, column)
+    return {'t': wall_clock_ms(kept['time']), 'y': _values(kept[column]), 'decimated': len(kept) < len(points)}
+
+
+# Hourly means and counts from an hourly rollup tier (time-indexed)
+def hourly_payload(hourly, metrics):
+    payload = {'t': wall_clock_ms(hourly.index)}
+    for metric in metrics:
+        if f'{metric}_mean' in hourly.columns:
+            counts = hourly[f'{metric}_count'].to_numpy()
+            payload[metric] = {'mean': _values(np.where(counts > 0, hourly[f'{metric}_mean'], 0.0)),
+                               'count': counts.astype('int64').tolist()}
+    return payload
+
+
+# Device, outdoor and comparison series of frames that are already cut to the range to draw
+def series_groups(metrics, frame, outdoor, aligned):
+    comparison = {}
+    for metric in metrics:
+        for kind in ['diff', 'ratio']:
+            column = f'{metric}_{kind}'
+            if column in aligned.columns:
+                comparison[column] = series_payload(aligned, column)
+    return {
+        'series': {m: series_payload(frame, m) for m in metrics if m in frame.columns},
+        'outdoor': {m: series_payload(outdoor, m) for m in metrics if m in outdoor.columns},
+        'comparison': comparison,
+    }
+
+
+# Payload for a device: its frame (with the heat index), the outdoor grid, the aligned
+# indoor/outdoor frame, and the hourly tiers of the device and the outdoor sensor
+def device_payload(device, metrics, frame, outdoor, aligned, hourly, outdoor_hourly):
+    if not frame.empty:
+        first, last = frame['time'].iloc[0], frame['time'].iloc[-1]
+        if not outdoor.empty:
+            outdoor = slice_time(outdoor, first, last)
+        if not outdoor_hourly.empty:
+            hours = outdoor_hourly.index
+            outdoor_hourly = outdoor_hourly[(hours > first - pd.Timedelta(hours=1)) & (hours <= last)]
+    return {
+        'device': device,
+        'metrics': metrics,
+        'max_points': MAX_POINTS,
+        **series_groups(metrics, frame, outdoor, aligned),
+        'hourly': hourly_payload(hourly, metrics),
+        'outdoor_hourly': hourly_payload(outdoor_hourly, metrics),
+    }
+
+
+# Payload for the readings of a device in [start, end] (date picker values), from frames cut to it
+def range_payload(device, start, end, metrics, frame, outdoor, aligned):
+    return {'device': device, 'start': start, 'end': end, **series_groups(metrics, frame, outdoor, aligned)}
@@ -0,0 +1,141 @@
+# Periodic data refresh, run next to the dashboard (gunicorn starts it when REFRESH_INTERVAL is set):
+#
+#     >> python refresh.py --interval 15m --lookback 1d
+#
+# Each cycle fetches the last --lookback of MCCI data from InfluxDB into the MCCI input directory
+# as a new export, then runs the ingest script incrementally over every input directory, so
+# PurpleAir and Awair exports dropped there are picked up as well. The lookback should cover the
+# interval; overlapping rows are de-duplicated by the ingest. Once the ingest has recorded a
+# fetched export it is deleted, so the input directory does not grow by one export per cycle;
+# a full re-ingest from the raw files therefore needs the MCCI history fetched again.
+#
+# Every file the dashboard reads is replaced atomically (written to a temporary file, then
+# renamed), so readers see either the old version or the new one. The ingest rewrites
+# catalog.json last; the dashboard watches it and loads the new data in the background
+# (app.start_data_watcher), and every cache is keyed on file versions, so nothing needs a restart.
+#
+# InfluxDB credentials are taken from INFLUXDB_USER (user:password), and INFLUXDB_URL overrides
+# the /query URL. A lock file keeps two
+# refreshes from running at once; use --once to run a single cycle, e.g. from cron.
+
+import argparse
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs are not serialized
+    fcntl = None
+
+import csvbydevice_final_fixed_nyc as ingest_script
+from influx_fetch import INFLUXDB_USER, TIME_FORMAT, fetch_csv, parse_timelapse
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+FAMILIES = ['mcci', 'purpleair', 'awair']
+FETCH_PREFIX = 'influx_'
+
+
+@contextmanager
+def run_lock(path):
+    with open(path, 'w') as fid:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fid, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+# Exports fetched by this script, named after their time range
+def fetched_exports(mcci_dir):
+    return [os.path.join(mcci_dir, f) for f in sorted(os.listdir(mcci_dir)) if f.startswith(FETCH_PREFIX)]
+
+
+# Fetch the last `lookback` of MCCI data as a new export in mcci_dir. Parts and temporary files
+# of earlier fetches that failed are removed first: their names hold their time range, so they
+# would never be resumed.
+def fetch_latest(mcci_dir, lookback, user, workers, url=None):
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - lookback
+    os.makedirs(mcci_dir, exist_ok=True)
+    for path in fetched_exports(mcci_dir):
+        if path.endswith('.parts'):
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.endswith('.tmp'):
+            os.remove(path)
+    csv_path = os.path.join(mcci_dir, f"{FETCH_PREFIX}{start.strftime('%Y%m%dT%H%M%S')}_{end.strftime('%Y%m%dT%H%M%S')}.csv")
+    print(f"Fetching MCCI data from {start.strftime(TIME_FORMAT)} to {end.strftime(TIME_FORMAT)}")
+    return fetch_csv(csv_path, start, end, workers=workers, user=user, url=url)
+
+
+def refresh_once(raw_dir, processed_dir, lookback, user=INFLUXDB_USER, workers=4, fetch=True):
+    raw_dirs = {family: os.path.join(raw_dir, f'{family}_unprocessed') for family in FAMILIES}
+    for path in raw_dirs.values():
+        os.makedirs(path, exist_ok=True)
+    ingest_script.configure(raw_dirs, processed_dir)
+    with run_lock(os.path.join(os.path.dirname(processed_dir), 'refresh.lock')) as acquired:
+        if not acquired:
+            print("[WARN] Another refresh is running; skipping this cycle")
+            return []
+        if fetch:
+            try:
+                fetch_latest(raw_dirs['mcci'], lookback, user, workers, os.environ.get('INFLUXDB_URL'))
+            except Exception as e:
+                print(f"[WARN] InfluxDB fetch failed, ingesting the files already present: {e}")
+        devices = ingest_script.ingest(incremental=True, workers=workers)
+        remove_ingested(raw_dirs['mcci'])
+        return devices
+
+
+# Delete fetched exports once the ingest has recorded them: their rows are in the processed
+# CSVs (and still in InfluxDB), and every cycle's export overlaps the previous ones, so keeping
+# them would only make each incremental run check more files. Their manifest entries go too.
+def remove_ingested(mcci_dir):
+    manifest = ingest_script.load_manifest(ingest_script.manifest_file)
+    removed = [path for path in fetched_exports(mcci_dir) if path.endswith('.csv') and path in manifest['files']]
+    for path in removed:
+        os.remove(path)
+        del manifest['files'][path]
+    if removed:
+        ingest_script.save_manifest(ingest_script.manifest_file, manifest)
+
+
+# '15m' / '1h' / '1d' style interval, in seconds
+def parse_interval(interval):
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[interval[-1]]
+    return int(interval[:-1]) * seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Periodically fetch and ingest new device data')
+    parser.add_argument('--raw-dir', default=os.path.join(base_dir, 'data_unprocessed'),
+                        help='directory holding mcci_unprocessed, purpleair_unprocessed and awair_unprocessed')
+    parser.add_argument('--processed-dir', default=os.path.join(base_dir, 'data_processed'))
+    parser.add_argument('--interval', default='15m', help="time between cycles, e.g. '15m' or '1h'")
+    parser.add_argument('--lookback', default='1d', help="MCCI window fetched each cycle, e.g. '1d' or '12h'")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--no-fetch', action='store_true', help='only ingest files already in the input directories')
+    parser.add_argument('--once', action='store_true', help='run one cycle and exit')
+    args = parser.parse_args()
+
+    interval = parse_interval(args.interval)
+    lookback = parse_timelapse(args.lookback)
+    user = os.environ.get('INFLUXDB_USER', INFLUXDB_USER)
+    while True:
+        started = time.monotonic()
+        try:
+            devices = refresh_once(args.raw_dir, args.processed_dir, lookback, user, args.workers, not args.no_fetch)
+            print(f"Refresh updated {len(devices)} devices: {', '.join(devices)}")
+        except Exception as e:
+            print(f"[WARN] Refresh failed: {e}")
+        if args.once:
+            break
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == '__main__':
+    main()
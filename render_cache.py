@@ -0,0 +1,143 @@
+# Memoization of rendered callback output.
+#
+# Entries are keyed on the callback's inputs plus a data-version token built from the files
+# the output depends on, so they stop matching as soon as new data lands. Backends:
+#
+#     memory      in-process LRU (default); RENDER_CACHE_SIZE entries
+#     filesystem  JSON files in RENDER_CACHE_DIR, shared by every worker on the machine
+#     off         no caching
+#
+# Select one with the RENDER_CACHE environment variable.
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+DEFAULT_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', 256))
+
+
+# Version of each file (mtime, size), or None for files that do not exist
+def version_token(paths):
+    token = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            token.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            token.append(None)
+    return token
+
+
+def make_key(name, args, version):
+    raw = json.dumps([name, args, version], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# One file per entry, holding the output as Dash serializes it (components and figures come
+# back as plain dicts, which Dash sends unchanged and which load far faster than unpickling
+# plotly objects). Writes go through a temp file and rename, so concurrent workers never read
+# a partial entry. The least recently used entries are pruned beyond max_entries.
+class FileBackend:
+    def __init__(self, directory, max_entries=DEFAULT_SIZE * 4):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as fid:
+                value = json.load(fid)
+        except (OSError, ValueError):
+            return None
+        # Refresh the access time used for pruning
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fid:
+            fid.write(to_json_plotly(value))
+        os.replace(tmp_path, self._path(key))
+        self._prune()
+
+    def _prune(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def backend_from_env():
+    kind = os.environ.get('RENDER_CACHE', 'memory')
+    if kind == 'off':
+        return None
+    if kind == 'filesystem':
+        directory = os.environ.get('RENDER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'iaq_render_cache'))
+        return FileBackend(directory)
+    return MemoryBackend()
+
+
+# Decorator: cache fn's return value keyed on its arguments and version_fn(*args), which should
+# return a JSON-serializable token that changes whenever the underlying data changes
+class Memoizer:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, version_fn):
+        def decorator(fn):
+            if self.backend is None:
+                return fn
+
+            @functools.wraps(fn)
+            def wrapper(*args):
+                key = make_key(fn.__name__, args, version_fn(*args))
+                value = self.backend.get(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+                self.misses += 1
+                value = fn(*args)
+                self.backend.set(key, value)
+                return value
+            return wrapper
+        return decorator
@@ -0,0 +1,139 @@
+# Rolling PM2.5 exposure statistics, stored with the rollups as a fourth tier:
+#
+#     data_rollups/<device>/rolling.parquet   one row per clock hour (Eastern time)
+#
+#     nowcast        EPA NowCast PM2.5 (µg/m³) at the end of the hour
+#     nowcast_aqi    AQI of the NowCast
+#     category       AQI category of the NowCast, 0 (Good) to 5 (Hazardous)
+#     pm25_24h       mean of the hourly means over the 24 hours ending with the hour
+#
+# Everything is computed from the hourly tier's PM2.5 means, laid on a regular hourly grid, so
+# the irregular reading times of the MCCI sensors only matter through which hours have readings:
+# an hour without readings is a gap, never a shorter window. As in EPA practice, the NowCast
+# needs two of the three most recent hours and the 24-hour mean needs 18 of its 24 hours;
+# other hours have no value. Hours with neither value are not stored.
+#
+# Each value depends only on the previous 24 hours, so after an ingest the tier is extended
+# from the new hours onwards (extend_rolling) instead of being rebuilt.
+
+import numpy as np
+import pandas as pd
+
+NOWCAST_HOURS = 12
+NOWCAST_MIN_RECENT = 2  # of the 3 most recent hours
+MEAN_HOURS = 24
+MEAN_MIN_HOURS = 18
+HISTORY = pd.Timedelta(hours=MEAN_HOURS - 1)
+
+# PM2.5 AQI breakpoints: (concentration low, high, AQI low, high), the same categories as
+# get_pm25_aqi_category in app.py; the last two rows are both Hazardous
+AQI_BREAKPOINTS = np.array([
+    (0.0, 12.0, 0, 50),
+    (12.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 150.4, 151, 200),
+    (150.5, 250.4, 201, 300),
+    (250.5, 350.4, 301, 400),
+    (350.5, 500.4, 401, 500),
+])
+CATEGORIES = ['Good', 'Moderate', 'Unhealthy for Sensitive Groups', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
+
+
+# Hourly PM2.5 means on a regular grid from the first to the last hour, NaN for hours without readings
+def hourly_grid(hourly):
+    if hourly.empty or 'pm.2.5_mean' not in hourly.columns:
+        return pd.Series(dtype='float64', index=pd.DatetimeIndex([], tz=getattr(hourly.index, 'tz', None)))
+    values = hourly['pm.2.5_mean'].where(hourly['pm.2.5_count'] > 0)
+    grid = pd.date_range(hourly.index[0], hourly.index[-1], freq='h')
+    return values.reindex(grid)
+
+
+# Trailing windows of `width` values ending at each position, most recent first
+def _windows(values, width):
+    padded = np.concatenate([np.full(width - 1, np.nan), values])
+    return np.lib.stride_tricks.sliding_window_view(padded, width)[:, ::-1]
+
+
+def nowcast(values):
+    windows = _windows(values, NOWCAST_HOURS)
+    valid = ~np.isnan(windows)
+    low = np.where(valid, windows, np.inf).min(axis=1)
+    high = np.where(valid, windows, -np.inf).max(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(high > 0, 1 - (high - low) / high, 1.0)
+    weight = np.clip(weight, 0.5, 1.0)
+
+    powers = weight[:, None] ** np.arange(NOWCAST_HOURS)
+    numerator = np.where(valid, powers * np.where(valid, windows, 0.0), 0.0).sum(axis=1)
+    denominator = np.where(valid, powers, 0.0).sum(axis=1)
+    enough = valid[:, :3].sum(axis=1) >= NOWCAST_MIN_RECENT
+    with np.errstate(invalid='ignore'):
+        return np.where(enough, numerator / denominator, np.nan)
+
+
+# Mean of the hourly means over each trailing 24 hours, from running sums
+def rolling_mean(values):
+    present = ~np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    lag = np.maximum(np.arange(1, len(values) + 1) - MEAN_HOURS, 0)
+    total = sums[1:] - sums[lag]
+    hours = counts[1:] - counts[lag]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(hours >= MEAN_MIN_HOURS, total / hours, np.nan)
+
+
+# AQI and category of PM2.5 concentrations, truncated to 0.1 µg/m³ as the EPA does
+def pm25_aqi(concentration):
+    truncated = np.clip(np.floor(np.asarray(concentration, dtype='float64') * 10) / 10, 0.0, AQI_BREAKPOINTS[-1, 1])
+    row = np.minimum(np.searchsorted(AQI_BREAKPOINTS[:, 1], np.nan_to_num(truncated), side='left'), len(AQI_BREAKPOINTS) - 1)
+    c_low, c_high, i_low, i_high = AQI_BREAKPOINTS[row].T
+    aqi = np.round((i_high - i_low) / (c_high - c_low) * (truncated - c_low) + i_low)
+    category = np.minimum(row, len(CATEGORIES) - 1).astype('float64')
+    missing = np.isnan(truncated)
+    return np.where(missing, np.nan, aqi), np.where(missing, np.nan, category)
+
+
+# The rolling tier for an hourly tier (time-indexed, with pm.2.5_mean and pm.2.5_count)
+def rolling_stats(hourly):
+    values = hourly_grid(hourly)
+    current = values.to_numpy(dtype='float64')
+    concentration = nowcast(current)
+    aqi, category = pm25_aqi(concentration)
+    tier = pd.DataFrame({'nowcast': concentration, 'nowcast_aqi': aqi, 'category': category,
+                         'pm25_24h': rolling_mean(current)}, index=values.index)
+    tier.index.name = 'time'
+    return tier[tier['nowcast'].notna() | tier['pm25_24h'].notna()]
+
+
+# Recompute the tier from `since` onwards, given the full updated hourly tier; earlier rows
+# are kept as stored. The stored tier ended with the old hourly grid, so the hours after its
+# last row (24-hour means still running on after the readings stopped) are recomputed too.
+# Without a stored tier the whole history is computed.
+def extend_rolling(stored, hourly, since):
+    if stored is None:
+        return rolling_stats(hourly)
+    if not stored.empty:
+        since = min(since, stored.index[-1] + pd.Timedelta(hours=1))
+    fresh = rolling_stats(hourly[hourly.index >= since - HISTORY])
+    return pd.concat([stored[stored.index < since], fresh[fresh.index >= since]])
+
+
+# Exposure figures for the summary from rolling rows of a range: the latest NowCast, the
+# highest 24-hour mean, and the hours spent in each NowCast category. None without PM2.5 data.
+def exposure_summary(rolling):
+    current = rolling.dropna(subset=['nowcast'])
+    if current.empty:
+        return None
+    latest = current.iloc[-1]
+    hours = current['category'].astype('int64').value_counts()
+    means = rolling['pm25_24h'].dropna()
+    return {
+        'time': current.index[-1],
+        'nowcast': float(latest['nowcast']),
+        'nowcast_aqi': int(latest['nowcast_aqi']),
+        'category': CATEGORIES[int(latest['category'])],
+        'category_hours': {name: int(hours.get(i, 0)) for i, name in enumerate(CATEGORIES)},
+        'max_24h': float(means.max()) if not means.empty else None,
+        'max_24h_time': means.idxmax() if not means.empty else None,
+    }
@@ -0,0 +1,174 @@
+# Pre-aggregated rollup tiers for the dashboard summaries.
+#
+#     data_rollups/<device>/hourly.parquet    one row per clock hour (Eastern time)
+#     data_rollups/<device>/daily.parquet     one row per calendar day
+#     data_rollups/<device>/profile.parquet   one row per hour of day, over the whole history
+#     data_rollups/<device>/rolling.parquet   NowCast and 24-hour PM2.5 per clock hour (rolling.py)
+#
+# Every tier but the rolling one has <metric>_mean, <metric>_min, <metric>_max and <metric>_count columns for
+# the metrics in ROLLUP_METRICS that the device reports. Means are combined across rows
+# weighted by count, so any range of whole hours or days gives the same result as the raw rows.
+#
+# The ingest script refreshes a device's tiers after writing its CSV. To build them for the
+# existing processed data run:  >> python rollups.py
+
+import argparse
+import os
+
+import pandas as pd
+
+from heat_index import calculate_heat_index_array
+from rolling import extend_rolling, rolling_stats
+from storage import parse_device_csv, source_is_current, write_parquet_atomic, write_source_version
+
+ROLLUP_METRICS = ['pm.2.5', 'tempF', 'rh', 'aqi', 'heat_index']
+STATS = ['mean', 'min', 'max', 'count']
+TIERS = ['hourly', 'daily', 'profile', 'rolling']
+
+
+def tier_path(rollup_dir, device, tier):
+    return os.path.join(rollup_dir, device, f'{tier}.parquet')
+
+
+def _with_heat_index(df):
+    if 'tempF' in df.columns and 'rh' in df.columns and 'heat_index' not in df.columns:
+        df = df.assign(heat_index=calculate_heat_index_array(df['tempF'], df['rh']))
+    return df
+
+
+def _aggregate(df, freq):
+    metrics = [m for m in ROLLUP_METRICS if m in df.columns]
+    tier = df[metrics].resample(freq).agg(STATS)
+    tier.columns = [f'{metric}_{stat}' for metric, stat in tier.columns]
+    counts = tier[[f'{m}_count' for m in metrics]]
+    tier[counts.columns] = counts.astype('int64')
+    # Buckets with no readings at all are not stored
+    return tier[counts.sum(axis=1) > 0]
+
+
+def tier_metrics(tier):
+    return [m for m in ROLLUP_METRICS if f'{m}_count' in tier.columns]
+
+
+# Combine tier rows into a single count-weighted mean for a metric
+def combined_mean(tier, metric):
+    count = tier[f'{metric}_count'].sum()
+    if count == 0:
+        return float('nan')
+    return float((tier[f'{metric}_mean'] * tier[f'{metric}_count']).sum() / count)
+
+
+# Hour-of-day profile (mean, min, max, count) from hourly rows
+def hour_of_day_profile(hourly):
+    hours = hourly.index.hour
+    columns = {}
+    for metric in tier_metrics(hourly):
+        mean, count = hourly[f'{metric}_mean'], hourly[f'{metric}_count']
+        weighted = (mean * count).groupby(hours).sum()
+        total = count.groupby(hours).sum()
+        columns[f'{metric}_mean'] = weighted / total.where(total > 0)
+        columns[f'{metric}_min'] = hourly[f'{metric}_min'].groupby(hours).min()
+        columns[f'{metric}_max'] = hourly[f'{metric}_max'].groupby(hours).max()
+        columns[f'{metric}_count'] = total
+    profile = pd.DataFrame(columns)
+    profile.index.name = 'hour'
+    return profile
+
+
+# The hourly tier alone of a time-indexed device frame
+def hourly_rollup(df):
+    return _aggregate(_with_heat_index(df), 'h')
+
+
+# Compute all tiers for a time-indexed device frame (as returned by parse_device_csv)
+def compute_rollups(df):
+    df = _with_heat_index(df)
+    hourly = _aggregate(df, 'h')
+    return {
+        'hourly': hourly,
+        'daily': _aggregate(df, 'D'),
+        'profile': hour_of_day_profile(hourly),
+        'rolling': rolling_stats(hourly),
+    }
+
+
+def write_rollups(rollup_dir, device, df, source_path=None):
+    device_dir = os.path.join(rollup_dir, device)
+    os.makedirs(device_dir, exist_ok=True)
+    for tier, frame in compute_rollups(df).items():
+        write_parquet_atomic(frame.reset_index(), tier_path(rollup_dir, device, tier))
+    if source_path is not None:
+        write_source_version(device_dir, source_path)
+
+
+# Recompute the tiers from `since` (a local midnight) onwards from `tail`, a time-indexed frame
+# holding every row of the device from `since` on. Earlier buckets are kept as stored.
+def update_rollups(rollup_dir, device, tail, since, source_path=None):
+    device_dir = os.path.join(rollup_dir, device)
+    os.makedirs(device_dir, exist_ok=True)
+    tail = _with_heat_index(tail)
+
+    tiers = {}
+    for tier, freq in [('hourly', 'h'), ('daily', 'D')]:
+        path = tier_path(rollup_dir, device, tier)
+        fresh = _aggregate(tail, freq)
+        if os.path.exists(path):
+            stored = read_tier(path)
+            fresh = pd.concat([stored[stored.index < since], fresh])
+        tiers[tier] = fresh
+    tiers['profile'] = hour_of_day_profile(tiers['hourly'])
+    path = tier_path(rollup_dir, device, 'rolling')
+    stored = read_tier(path) if os.path.exists(path) else None
+    tiers['rolling'] = extend_rolling(stored, tiers['hourly'], since)
+
+    for tier, frame in tiers.items():
+        write_parquet_atomic(frame.reset_index(), tier_path(rollup_dir, device, tier))
+    if source_path is not None:
+        write_source_version(device_dir, source_path)
+
+
+def rollups_are_current(rollup_dir, device, csv_path):
+    return source_is_current(os.path.join(rollup_dir, device), csv_path)
+
+
+def read_tier(path):
+    df = pd.read_parquet(path)
+    return df.set_index(df.columns[0])
+
+
+# Rows of a time-indexed tier whose bucket starts in [start, end)
+def slice_tier(tier, start=None, end=None):
+    mask = pd.Series(True, index=tier.index)
+    if start is not None:
+        mask &= tier.index >= start
+    if end is not None:
+        mask &= tier.index < end
+    return tier[mask.values]
+
+
+# With stale_only, devices whose tiers already match their CSV are left alone
+def build_all(source_dir, rollup_dir, stale_only=False):
+    for file in sorted(os.listdir(source_dir)):
+        if not file.endswith('.csv'):
+            continue
+        device = file[:-4]
+        csv_path = os.path.join(source_dir, file)
+        if stale_only and rollups_are_current(rollup_dir, device, csv_path):
+            continue
+        try:
+            df = parse_device_csv(csv_path, [m for m in ROLLUP_METRICS if m != 'heat_index'])
+            write_rollups(rollup_dir, device, df, source_path=csv_path)
+        except Exception as e:
+            print(f"[WARN] Skipping {file}: {e}")
+            continue
+        print(f"Rollups written for {device}")
+
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Build hourly/daily rollup tiers from processed CSVs')
+    parser.add_argument('--source', default=os.path.join(base_dir, 'data_processed'))
+    parser.add_argument('--dest', default=os.path.join(base_dir, 'data_rollups'))
+    parser.add_argument('--stale', action='store_true', help='only devices whose CSV changed since their tiers were built')
+    args = parser.parse_args()
+    build_all(args.source, args.dest, stale_only=args.stale)
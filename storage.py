@@ -0,0 +1,321 @@
+# Columnar storage for processed device data.
+#
+# Each device is stored as one Parquet file per calendar month (Eastern time):
+#
+#     data_store/<device>/<YYYY-MM>.parquet
+#     data_store/<device>/_source.json   (version of the CSV the partitions were built from)
+#
+# The tz-aware 'time' column is stored natively, so reads skip text parsing, and a
+# date-range query only opens the months it overlaps.
+#
+# Migrate the existing CSVs with:  >> python storage.py migrate
+
+import argparse
+import csv
+import io
+import json
+import os
+
+import pandas as pd
+
+from data_cache import file_version
+from timeparse import parse_times
+
+TIMEZONE = 'America/New_York'
+SOURCE_FILE = '_source.json'
+
+# Measurement columns the dashboard reads from each device family, all held as float32.
+# The rest stays in the CSVs and the store but is never loaded by the dashboard: MCCI dust
+# bins, TVOC, tDewC, vBat, boot, the device column and the empty 'Unnamed: 18' left by the
+# trailing comma of the InfluxDB export; Awair co2, voc, noise and light; PurpleAir pressure.
+FAMILY_SCHEMAS = {
+    'mcci': ['pm.2.5', 'tempF', 'rh', 'aqi'],
+    'awair': ['pm.2.5', 'tempF', 'rh', 'aqi'],
+    'purpleair': ['pm.2.5', 'tempF', 'rh'],
+}
+PURPLEAIR_DEVICES = {'88439'}
+
+
+def device_family(device):
+    if device in PURPLEAIR_DEVICES:
+        return 'purpleair'
+    if device.startswith('awair'):
+        return 'awair'
+    return 'mcci'
+
+
+def schema_columns(device):
+    return FAMILY_SCHEMAS[device_family(device)]
+
+
+# Turn raw processed rows into a time-indexed frame with float32 measurement columns (or
+# `dtype`). The index is datetime64[ns, America/New_York]: int64 UTC epochs carrying the zone
+# as metadata, so the conversion costs nothing until a local field (hour, date) is asked for.
+def normalize_device_frame(df, dtype='float32'):
+    df['time'] = parse_times(df['time'], tz=TIMEZONE)
+    df = df[df['time'].notna()].set_index('time').sort_index()
+    # Empty columns pandas names after blank headers (e.g. from a trailing comma)
+    junk = [c for c in df.columns if str(c).startswith('Unnamed: ') and df[c].isna().all()]
+    df = df.drop(columns=junk)
+    numeric_cols = df.select_dtypes(include='number').columns
+    df[numeric_cols] = df[numeric_cols].astype(dtype)
+    return df
+
+
+# Parse a processed device CSV into a time-indexed frame with float32 measurement columns.
+# With `columns`, only those (if present) are read, straight to float32.
+def parse_device_csv(file_path, columns=None):
+    if columns is None:
+        return normalize_device_frame(pd.read_csv(file_path))
+    wanted = set(columns)
+    df = pd.read_csv(file_path, usecols=lambda c: c == 'time' or c in wanted,
+                     dtype={c: 'float32' for c in columns})
+    return normalize_device_frame(df)
+
+
+def read_csv_header(csv_path):
+    with open(csv_path, newline='') as fid:
+        return next(csv.reader(fid))
+
+
+# Parse the rows of a processed device CSV from a byte offset onwards (see append_device_rows)
+def parse_device_csv_from(csv_path, offset):
+    header = read_csv_header(csv_path)
+    with open(csv_path, 'rb') as fid:
+        fid.seek(offset)
+        return normalize_device_frame(pd.read_csv(fid, names=header, header=None))
+
+
+# Rows of a processed device CSV with times in [start, end], as float64 so values keep the
+# precision they were written with (for exports). Only the lines of the range are read.
+def read_device_range(csv_path, start, end, columns):
+    header = read_csv_header(csv_path)
+    lo = find_time_offset(csv_path, start)
+    hi = find_time_offset(csv_path, end + pd.Timedelta(1, unit='ns'))
+    wanted = set(columns)
+    with open(csv_path, 'rb') as fid:
+        fid.seek(lo)
+        data = io.BytesIO(fid.read(hi - lo))
+    df = pd.read_csv(data, names=header, header=None, usecols=lambda c: c == 'time' or c in wanted,
+                     dtype={c: 'float64' for c in columns})
+    return normalize_device_frame(df, dtype='float64')
+
+
+def _line_time(line, time_col):
+    value = next(csv.reader([line.decode('utf-8')]))[time_col]
+    return pd.to_datetime(value, errors='coerce', utc=True)
+
+
+# Byte offset of the first data line whose time is >= since, found by binary search over
+# the file (processed CSVs are written sorted by time). Returns the file size if there is none.
+def find_time_offset(csv_path, since):
+    header = read_csv_header(csv_path)
+    time_col = header.index('time')
+    since = pd.Timestamp(since).tz_convert('UTC')
+    with open(csv_path, 'rb') as fid:
+        data_start = len(fid.readline())
+        size = fid.seek(0, os.SEEK_END)
+
+        # First complete line starting at or after pos
+        def line_at(pos):
+            fid.seek(pos - 1)
+            if fid.read(1) != b'\n':
+                fid.readline()
+            start = fid.tell()
+            return start, fid.readline()
+
+        lo, hi = data_start, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, line = line_at(mid)
+            if not line or not (_line_time(line, time_col) < since):
+                hi = mid
+            else:
+                lo = start + len(line)
+        return line_at(lo)[0]
+
+
+# Copy the first `length` bytes of a file into another (open) file
+def copy_head(src_path, dst, length):
+    with open(src_path, 'rb') as src:
+        while length > 0:
+            block = src.read(min(length, 1 << 20))
+            if not block:
+                break
+            dst.write(block)
+            length -= len(block)
+
+
+# Merge new rows into a processed device CSV without re-parsing its history. Only the
+# rows from `since` (which must be <= the earliest new row) onwards are re-read, de-duplicated
+# on time and rewritten; the bytes before them are copied as they are. The result is written
+# to a temporary file and renamed over the CSV, so readers see either the old file or the new
+# one. Returns the byte offset the rewritten tail starts at.
+def append_device_rows(csv_path, new_rows, since):
+    header = read_csv_header(csv_path)
+    offset = find_time_offset(csv_path, since)
+    with open(csv_path, 'rb') as fid:
+        fid.seek(offset)
+        tail = pd.read_csv(fid, names=header, header=None)
+    tail['time'] = parse_times(tail['time'], tz=TIMEZONE)
+
+    # Existing rows win over new rows with the same timestamp, as in a full merge
+    new_rows = new_rows.reindex(columns=header)
+    merged = pd.concat([tail, new_rows]) if not tail.empty else new_rows
+    merged = merged.drop_duplicates(subset=['time']).sort_values(by='time')
+    tmp_path = csv_path + '.tmp'
+    with open(tmp_path, 'wb') as fid:
+        copy_head(csv_path, fid, offset)
+    merged.to_csv(tmp_path, mode='a', header=False, index=False)
+    os.replace(tmp_path, csv_path)
+    return offset
+
+
+# Write a frame as a CSV through a temporary file, so readers never see it half-written
+def write_csv_atomic(df, path):
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def partition_name(year, month):
+    return f'{year:04d}-{month:02d}.parquet'
+
+
+def partition_bounds(name):
+    year, month = int(name[:4]), int(name[5:7])
+    start = pd.Timestamp(year=year, month=month, day=1).tz_localize(TIMEZONE)
+    end = (pd.Timestamp(year=year, month=month, day=1) + pd.offsets.MonthBegin(1)).tz_localize(TIMEZONE)
+    return start, end
+
+
+def list_partitions(store_dir, device):
+    device_dir = os.path.join(store_dir, device)
+    try:
+        names = os.listdir(device_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names if n.endswith('.parquet'))
+
+
+# Partitions whose month overlaps [start, end]; either bound may be None
+def partitions_in_range(store_dir, device, start=None, end=None):
+    selected = []
+    for name in list_partitions(store_dir, device):
+        part_start, part_end = partition_bounds(name)
+        if start is not None and part_end <= start:
+            continue
+        if end is not None and part_start > end:
+            continue
+        selected.append(os.path.join(store_dir, device, name))
+    return selected
+
+
+# Derived files are only used while they were built from the CSV currently on disk
+def source_is_current(derived_dir, csv_path):
+    try:
+        with open(os.path.join(derived_dir, SOURCE_FILE)) as fid:
+            source = json.load(fid)
+        return tuple(source['version']) == file_version(csv_path)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def write_source_version(derived_dir, source_path):
+    source = {'path': os.path.basename(source_path), 'version': list(file_version(source_path))}
+    source_file = os.path.join(derived_dir, SOURCE_FILE)
+    with open(source_file + '.tmp', 'w') as fid:
+        json.dump(source, fid)
+    os.replace(source_file + '.tmp', source_file)
+
+
+def store_is_current(store_dir, device, csv_path):
+    return source_is_current(os.path.join(store_dir, device), csv_path)
+
+
+# Read one partition as a time-indexed frame, keeping only the requested columns
+def read_partition(path, columns=None):
+    if columns is not None:
+        import pyarrow.parquet as pq
+        available = set(pq.read_schema(path).names)
+        columns = ['time'] + [c for c in columns if c in available and c != 'time']
+    return pd.read_parquet(path, columns=columns).set_index('time')
+
+
+def write_parquet_atomic(df, path):
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# Write a device frame (time-indexed, as returned by parse_device_csv) as monthly partitions
+def write_partitions(store_dir, device, df, source_path=None):
+    device_dir = os.path.join(store_dir, device)
+    os.makedirs(device_dir, exist_ok=True)
+
+    written = set()
+    index = df.index
+    for (year, month), part in df.groupby([index.year, index.month]):
+        name = partition_name(year, month)
+        write_parquet_atomic(part.reset_index(), os.path.join(device_dir, name))
+        written.add(name)
+
+    # Drop partitions for months that no longer have data
+    for name in list_partitions(store_dir, device):
+        if name not in written:
+            os.remove(os.path.join(device_dir, name))
+
+    if source_path is not None:
+        write_source_version(device_dir, source_path)
+    return len(written)
+
+
+# Replace the partitions from `since` onwards with `tail`, a time-indexed frame holding every
+# row of the device from `since` on. Rows before `since` in its month are kept.
+def update_partitions(store_dir, device, tail, since, source_path=None):
+    device_dir = os.path.join(store_dir, device)
+    os.makedirs(device_dir, exist_ok=True)
+
+    first_path = os.path.join(device_dir, partition_name(since.year, since.month))
+    if os.path.exists(first_path):
+        head = read_partition(first_path)
+        tail = pd.concat([head[head.index < since], tail])
+
+    index = tail.index
+    for (year, month), part in tail.groupby([index.year, index.month]):
+        write_parquet_atomic(part.reset_index(), os.path.join(device_dir, partition_name(year, month)))
+
+    if source_path is not None:
+        write_source_version(device_dir, source_path)
+
+
+# With stale_only, devices whose partitions already match their CSV are left alone
+def migrate(source_dir, store_dir, stale_only=False):
+    for file in sorted(os.listdir(source_dir)):
+        if not file.endswith('.csv'):
+            continue
+        device = file[:-4]
+        csv_path = os.path.join(source_dir, file)
+        if stale_only and store_is_current(store_dir, device, csv_path):
+            continue
+        try:
+            df = parse_device_csv(csv_path)
+        except Exception as e:
+            print(f"[WARN] Skipping {file}: {e}")
+            continue
+        count = write_partitions(store_dir, device, df, source_path=csv_path)
+        print(f"Migrated {device}: {len(df)} rows in {count} partitions")
+
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Columnar storage for processed device data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='build the partitioned store from processed CSVs')
+    migrate_parser.add_argument('--source', default=os.path.join(base_dir, 'data_processed'))
+    migrate_parser.add_argument('--dest', default=os.path.join(base_dir, 'data_store'))
+    migrate_parser.add_argument('--stale', action='store_true', help='only devices whose CSV changed since their partitions were built')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.source, args.dest, stale_only=args.stale)
@@ -0,0 +1,66 @@
+# The vectorized heat index must agree with the scalar NWS version element by element:
+#
+#     >> python -m pytest tests
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heat_index import calculate_heat_index, calculate_heat_index_array
+
+# Temperatures (°F) and humidities (%) where calculate_heat_index changes branch
+TEMP_BOUNDARIES = [80.0, 87.0, 95.0, 112.0]
+RH_BOUNDARIES = [13.0, 40.0, 85.0]
+
+
+def scalar(temp_f, rh):
+    return np.array([calculate_heat_index(t, r) for t, r in zip(temp_f, rh)], dtype='float64')
+
+
+def assert_matches(temp_f, rh):
+    expected = scalar(temp_f, rh)
+    actual = calculate_heat_index_array(temp_f, rh)
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-9, equal_nan=True)
+
+
+# Each boundary, the values on either side of it, and points well inside each branch
+def around(boundaries, spacing):
+    values = []
+    for b in boundaries:
+        values += [np.nextafter(b, -np.inf), b, np.nextafter(b, np.inf), b - spacing, b + spacing]
+    return np.array(values)
+
+
+def test_random_points():
+    rng = np.random.default_rng(0)
+    temp_f = rng.uniform(-20, 130, 100_000)
+    rh = rng.uniform(0, 100, 100_000)
+    assert_matches(temp_f, rh)
+
+
+def test_branch_boundaries():
+    temps = np.concatenate([around(TEMP_BOUNDARIES, 0.5), [60.0, 83.0, 100.0, 120.0]])
+    rhs = np.concatenate([around(RH_BOUNDARIES, 0.5), [0.0, 5.0, 25.0, 60.0, 95.0, 100.0]])
+    temp_f, rh = (grid.ravel() for grid in np.meshgrid(temps, rhs))
+    assert_matches(temp_f, rh)
+
+
+@pytest.mark.parametrize('temp_f, rh', [
+    ([np.nan, 85.0, np.nan], [50.0, np.nan, np.nan]),
+    ([np.nan, 70.0], [10.0, np.nan]),
+])
+def test_nan_inputs(temp_f, rh):
+    assert_matches(np.array(temp_f), np.array(rh))
+    assert np.isnan(calculate_heat_index_array(temp_f, rh)).all()
+
+
+def test_accepts_series_and_float32():
+    import pandas as pd
+    temp_f = pd.Series([75.0, 90.0, 100.0, 84.0], dtype='float32')
+    rh = pd.Series([50.0, 60.0, 10.0, 90.0], dtype='float32')
+    expected = scalar(temp_f.astype('float64'), rh.astype('float64'))
+    np.testing.assert_allclose(calculate_heat_index_array(temp_f, rh), expected, rtol=1e-12)
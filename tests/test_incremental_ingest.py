@@ -0,0 +1,151 @@
+# Incremental ingest (append_device_rows and the partition/rollup updates it drives) must leave
+# the same processed CSV, store partitions and rollup tiers as a full run over the same exports:
+#
+#     >> python -m pytest tests
+#
+# The processed CSV starts as the tail of a real one, which ends with a row without a time, and
+# the second export's rewritten region starts on the day the clocks go back (2024-11-03).
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+
+import csvbydevice_final_fixed_nyc as ingest_script
+from rollups import TIERS, read_tier, tier_path
+from storage import find_time_offset, list_partitions, read_partition
+
+DEVICE = 'eui-0002cc01000009cc'
+SOURCE_CSV = os.path.join(base_dir, 'data_processed', f'{DEVICE}.csv')
+HEAD_ROWS = 1500
+# Raw MCCI export columns, in InfluxDB order; the trailing comma adds an unnamed 19th column
+RAW_COLUMNS = ['aqi', 'TVOC', 'dust.0.3', 'dust.0.5', 'dust.1.0', 'dust.2.5', 'dust.5', 'dust.10',
+               'pm.1.0', 'pm.2.5', 'pm.10', 'tempC', 'rh', 'tDewC', 'vBat', 'boot']
+FAMILIES = ['mcci', 'purpleair', 'awair']
+
+
+# Header and the last HEAD_ROWS lines of the real processed CSV, the last of them without a time
+def processed_start(path):
+    with open(SOURCE_CSV) as fid:
+        lines = fid.readlines()
+    assert lines[-1].split(',')[1] == ''
+    with open(path, 'w') as fid:
+        fid.writelines([lines[0]] + lines[-HEAD_ROWS:])
+
+
+# An MCCI export every 6 minutes over [start, end) UTC; `seed` varies the readings, so rows
+# that two exports share have different values and the merge order shows
+def write_export(path, start, end, seed):
+    times = pd.date_range(start, end, freq='6min', inclusive='left', tz='UTC')
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'device': DEVICE, 'time': times.strftime('%Y-%m-%dT%H:%M:%S.%fZ')})
+    for column in RAW_COLUMNS:
+        df[column] = rng.uniform(0, 50, len(df)).round(3)
+    df[''] = ''
+    df.to_csv(path, index=False)
+
+
+EXPORTS = [('export_1.csv', '2024-11-02T12:00:00', '2024-11-03T07:30:00', 1),
+           ('export_2.csv', '2024-11-03T05:12:00', '2024-11-04T06:00:00', 2)]
+
+
+def setup_dirs(root):
+    raw_dirs = {family: str(root / 'raw' / f'{family}_unprocessed') for family in FAMILIES}
+    for path in raw_dirs.values():
+        os.makedirs(path)
+    processed_dir = root / 'data_processed'
+    processed_dir.mkdir()
+    ingest_script.configure(raw_dirs, str(processed_dir))
+    csv_path = str(processed_dir / f'{DEVICE}.csv')
+    processed_start(csv_path)
+    return raw_dirs['mcci'], csv_path
+
+
+def full_run(root):
+    mcci_dir, csv_path = setup_dirs(root)
+    for name, start, end, seed in EXPORTS:
+        write_export(os.path.join(mcci_dir, name), start, end, seed)
+    ingest_script.ingest(incremental=False, workers=1)
+    return csv_path
+
+
+# The store and rollups are built first, so each ingest updates them from the rewritten tail
+def incremental_run(root):
+    mcci_dir, csv_path = setup_dirs(root)
+    ingest_script.refresh_derived(DEVICE, csv_path)
+    for name, start, end, seed in EXPORTS:
+        write_export(os.path.join(mcci_dir, name), start, end, seed)
+        ingest_script.ingest(incremental=True, workers=1)
+    return csv_path
+
+
+@pytest.fixture(scope='module')
+def runs(tmp_path_factory):
+    full = full_run(tmp_path_factory.mktemp('full'))
+    incremental = incremental_run(tmp_path_factory.mktemp('incremental'))
+    return full, incremental
+
+
+def derived_dir(csv_path, name):
+    return os.path.join(os.path.dirname(os.path.dirname(csv_path)), name)
+
+
+def test_csv_matches_full_run(runs):
+    full, incremental = (pd.read_csv(path) for path in runs)
+    pd.testing.assert_frame_equal(incremental, full)
+    # 195 + 248 export rows, 23 of them shared; the timeless row is still last
+    assert len(full) == HEAD_ROWS + 195 + 248 - 23
+    assert full['time'].isna().sum() == 1 and pd.isna(full['time'].iloc[-1])
+    times = pd.to_datetime(full['time'].iloc[:-1], utc=True, format='ISO8601')
+    assert times.is_monotonic_increasing and times.is_unique
+    # Where the exports overlap, the rows already merged from the first one are kept
+    first = pd.read_csv(os.path.join(os.path.dirname(runs[0]), '..', 'raw', 'mcci_unprocessed', 'export_1.csv'))
+    shared = full[times.reindex(full.index) == pd.Timestamp('2024-11-03T06:30:00Z')]
+    assert shared['pm.2.5'].item() == first.loc[first['time'] == '2024-11-03T06:30:00.000000Z', 'pm.2.5'].item()
+
+
+def test_store_matches_full_run(runs):
+    full, incremental = (derived_dir(path, 'data_store') for path in runs)
+    names = list_partitions(full, DEVICE)
+    assert names == list_partitions(incremental, DEVICE)
+    assert '2024-11.parquet' in names
+    for name in names:
+        pd.testing.assert_frame_equal(read_partition(os.path.join(incremental, DEVICE, name)),
+                                      read_partition(os.path.join(full, DEVICE, name)))
+
+
+def test_rollups_match_full_run(runs):
+    full, incremental = (derived_dir(path, 'data_rollups') for path in runs)
+    for tier in TIERS:
+        expected = read_tier(tier_path(full, DEVICE, tier))
+        actual = read_tier(tier_path(incremental, DEVICE, tier))
+        # Running sums in the rolling tier start from a different hour, so allow for rounding
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+    daily = read_tier(tier_path(full, DEVICE, 'daily'))
+    assert daily.loc['2024-11-03', 'pm.2.5_count'].item() == 250  # 25 hours on the day the clocks go back
+
+
+# The binary search agrees with a linear scan, including inside the repeated hour and at the
+# timeless last row
+@pytest.mark.parametrize('since', [
+    '2024-01-01T00:00:00-05:00', '2024-11-03T00:00:00-04:00', '2024-11-03T01:30:00-04:00',
+    '2024-11-03T01:30:00-05:00', '2024-11-03T01:59:59-05:00', '2024-11-04T00:54:00-05:00',
+    '2030-01-01T00:00:00-05:00',
+])
+def test_find_time_offset(runs, since):
+    csv_path = runs[0]
+    since = pd.Timestamp(since)
+    offset = len(open(csv_path, 'rb').readline())
+    with open(csv_path, 'rb') as fid:
+        lines = fid.readlines()[1:]
+    times = pd.to_datetime([line.split(b',')[1].decode() or None for line in lines], utc=True, format='ISO8601')
+    for line, time in zip(lines, times):
+        if pd.isna(time) or time >= since:
+            break
+        offset += len(line)
+    assert find_time_offset(csv_path, since) == offset
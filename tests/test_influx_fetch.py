@@ -0,0 +1,145 @@
+# influx_fetch against a local stub of the InfluxDB /query endpoint, which answers each request
+# from a queue of planned responses:
+#
+#     >> python -m pytest tests
+
+import http.server
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from influx_fetch import fetch_csv
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ROWS_PER_CHUNK = 50
+
+
+# Two JSON documents per response, sent as separate HTTP chunks, as InfluxDB does with chunked=true
+def documents(query):
+    day = query.split("time >= '")[1][:10]
+    return [json.dumps({'results': [{'statement_id': 0, 'series': [{
+        'name': 'EnvironmentalData', 'tags': {'devID': 'eui-test'}, 'columns': ['time', 'pm.2.5', 'rh'],
+        'values': [[f'{day}T{part:02d}:{i % 60:02d}:00Z', i * 0.5, 40.0 + part] for i in range(ROWS_PER_CHUNK)],
+    }], 'partial': part == 0}]}).encode() for part in range(2)]
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)['q'][0]
+        self.server.queries.append(query)
+        kind = self.server.plan.pop(0) if self.server.plan else 'ok'
+        if kind == '503':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if kind == 'error':
+            body = [json.dumps({'results': [{'statement_id': 0, 'error': 'query timeout'}]}).encode()]
+        else:
+            body = documents(query)
+        for i, document in enumerate(body):
+            if kind == 'drop' and i == 1:
+                # Half of the second chunk, then the connection goes away
+                self.wfile.write(b'%x\r\n' % len(document) + document[:len(document) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(document), document))
+        self.wfile.write(b'0\r\n\r\n')
+
+
+@pytest.fixture
+def stub():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.plan = []
+    server.queries = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_port}/query'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(stub, csv_path, days=1):
+    return fetch_csv(str(csv_path), START, START + timedelta(days=days), workers=1, url=stub.url)
+
+
+def data_rows(csv_path):
+    with open(csv_path) as fid:
+        header = fid.readline()
+        return header, fid.read().splitlines()
+
+
+def test_complete_fetch(stub, tmp_path):
+    csv_path = tmp_path / 'out.csv'
+    fetch(stub, csv_path, days=2)
+    header, rows = data_rows(csv_path)
+    assert header == 'device,time,pm.2.5,rh,\n'
+    assert len(rows) == 2 * 2 * ROWS_PER_CHUNK
+    assert rows[0].startswith('eui-test,2024-01-01T00:00:00Z,0.0,40.0')
+    assert len(stub.queries) == 2
+    assert os.listdir(tmp_path) == ['out.csv']
+
+
+def test_503_is_retried(stub, tmp_path):
+    stub.plan = ['503', '503']
+    fetch(stub, tmp_path / 'out.csv')
+    assert len(stub.queries) == 3
+    assert len(data_rows(tmp_path / 'out.csv')[1]) == 2 * ROWS_PER_CHUNK
+
+
+def test_dropped_connection_is_retried(stub, tmp_path):
+    stub.plan = ['drop']
+    fetch(stub, tmp_path / 'out.csv')
+    assert len(stub.queries) == 2
+    # Nothing from the broken attempt is kept
+    assert len(data_rows(tmp_path / 'out.csv')[1]) == 2 * ROWS_PER_CHUNK
+
+
+def test_error_entry_is_retried(stub, tmp_path):
+    stub.plan = ['error']
+    fetch(stub, tmp_path / 'out.csv')
+    assert len(stub.queries) == 2
+    assert len(data_rows(tmp_path / 'out.csv')[1]) == 2 * ROWS_PER_CHUNK
+
+
+def test_failing_window_leaves_no_part(stub, tmp_path):
+    stub.plan = ['error', 'drop', 'error']
+    csv_path = tmp_path / 'out.csv'
+    with pytest.raises(RuntimeError):
+        fetch(stub, csv_path)
+    assert not csv_path.exists()
+    # Neither a completed part nor a temporary one, so a rerun fetches the window again
+    assert os.listdir(tmp_path / 'out.csv.parts') == []
+
+
+def test_resume_skips_fetched_windows(stub, tmp_path):
+    csv_path = tmp_path / 'out.csv'
+    parts_dir = tmp_path / 'out.csv.parts'
+    parts_dir.mkdir()
+    (parts_dir / '20240101T000000_20240102T000000.csv').write_text(
+        'device,time,pm.2.5,rh,\neui-test,2024-01-01T00:00:00Z,7.0,50.0,\n')
+    fetch(stub, csv_path, days=2)
+    assert len(stub.queries) == 1
+    assert "time >= '2024-01-02T00:00:00Z'" in stub.queries[0]
+    header, rows = data_rows(csv_path)
+    assert rows[0] == 'eui-test,2024-01-01T00:00:00Z,7.0,50.0,'
+    assert len(rows) == 1 + 2 * ROWS_PER_CHUNK
+    assert not parts_dir.exists()
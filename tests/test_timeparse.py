@@ -0,0 +1,94 @@
+# parse_times must give the same instants for the same file every time, however its rows are
+# shaped: DST transitions in wall-clock times, mixed precisions, invalid dates and rows that do
+# not fit the layout detected for their length:
+#
+#     >> python -m pytest tests
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timeparse import TIMEZONE, parse_times
+
+
+def utc(values):
+    return list(pd.to_datetime(values, utc=True, format='ISO8601'))
+
+
+def parsed(values, naive_tz=None):
+    return list(parse_times(pd.Series(values, dtype=object), naive_tz=naive_tz).dt.tz_convert('UTC'))
+
+
+# An Awair file through the hour repeated when DST ends: the first pass (EDT) holds until the
+# wall clock steps back, and everything after is the second pass (EST)
+def test_repeated_hour_first_pass_until_clock_steps_back():
+    wall = ['2024-11-03T00:50:00', '2024-11-03T01:00:00', '2024-11-03T01:30:00', '2024-11-03T01:55:00',
+            '2024-11-03T01:00:00', '2024-11-03T01:30:00', '2024-11-03T01:59:00', '2024-11-03T02:00:00']
+    assert parsed(wall, naive_tz=TIMEZONE) == utc([
+        '2024-11-03T04:50:00Z', '2024-11-03T05:00:00Z', '2024-11-03T05:30:00Z', '2024-11-03T05:55:00Z',
+        '2024-11-03T06:00:00Z', '2024-11-03T06:30:00Z', '2024-11-03T06:59:00Z', '2024-11-03T07:00:00Z',
+    ])
+
+
+def test_repeated_hour_without_step_back_is_first_pass():
+    wall = ['2024-11-03T01:10:00', '2024-11-03T01:40:00']
+    assert parsed(wall, naive_tz=TIMEZONE) == utc(['2024-11-03T05:10:00Z', '2024-11-03T05:40:00Z'])
+
+
+# Processed CSVs carry the offset, so both passes are told apart without any rule
+def test_repeated_hour_with_offsets():
+    values = ['2024-11-03 01:30:00.000000-04:00', '2024-11-03 01:30:00.000000-05:00']
+    assert parsed(values, naive_tz=TIMEZONE) == utc(['2024-11-03T05:30:00Z', '2024-11-03T06:30:00Z'])
+
+
+def test_skipped_hour_is_shifted_forward():
+    wall = ['2024-03-10T01:55:00', '2024-03-10T02:30:00', '2024-03-10T03:05:00']
+    assert parsed(wall, naive_tz=TIMEZONE) == utc(['2024-03-10T06:55:00Z', '2024-03-10T07:00:00Z', '2024-03-10T07:05:00Z'])
+
+
+# InfluxDB drops trailing zeros of the fraction, and the fraction altogether on whole seconds
+def test_mixed_fraction_lengths():
+    values = ['2024-03-12T15:44:28.141Z', '2024-03-12T15:44:29Z', '2024-03-12T15:44:30.5Z',
+              '2024-03-12T15:44:31.14Z', '2024-03-12T15:44:32.000123Z', '2024-03-12T15:44:33.9Z']
+    assert parsed(values) == utc(values)
+
+
+def test_invalid_dates_are_nat():
+    values = ['2024-02-28T12:00:00Z', '2024-02-30T12:00:00Z', '2023-02-29T12:00:00Z',
+              '2024-02-29T12:00:00Z', '2024-13-01T12:00:00Z', '2024-04-31T12:00:00Z', '2024-04-30T24:00:00Z']
+    result = parsed(values)
+    assert result[0] == pd.Timestamp('2024-02-28T12:00:00Z')
+    assert result[3] == pd.Timestamp('2024-02-29T12:00:00Z')
+    assert all(pd.isna(result[i]) for i in [1, 2, 4, 5, 6])
+
+
+def test_missing_values_are_nat():
+    result = parsed(['2024-03-12T15:44:28Z', None, float('nan'), ''])
+    assert result[0] == pd.Timestamp('2024-03-12T15:44:28Z')
+    assert all(pd.isna(t) for t in result[1:])
+
+
+# Rows of the same length as the first, but another shape, go to pandas; so does a length
+# whose first value is not ISO 8601 at all
+def test_rows_not_fitting_the_layout_fall_back():
+    values = ['2024-03-12 11:44:28-04:00', '2024-03-12T11:44:28+01:00', '2024-03-12 11:44:28-0400 ',
+              '2024/03/12 11:44:28-04:00', 'Mar 12 2024 11:44AM', 'not a time', '2024-03-12T15:44:28Z']
+    result = parsed(values)
+    assert result[0] == pd.Timestamp('2024-03-12T15:44:28Z')
+    assert result[1] == pd.Timestamp('2024-03-12T10:44:28Z')
+    assert result[2] == pd.Timestamp('2024-03-12T15:44:28Z')
+    assert result[3] == pd.Timestamp('2024-03-12T15:44:28Z')
+    assert result[4] == pd.Timestamp('2024-03-12T11:44:00Z')
+    assert pd.isna(result[5])
+    assert result[6] == pd.Timestamp('2024-03-12T15:44:28Z')
+
+
+def test_result_is_in_tz_and_keeps_the_index():
+    values = pd.Series(['2024-03-12T15:44:28.141Z', '2024-07-01T12:00:00Z'], index=[10, 20], name='time')
+    result = parse_times(values)
+    assert str(result.dt.tz) == TIMEZONE
+    assert list(result.index) == [10, 20] and result.name == 'time'
+    assert str(result.iloc[0]) == '2024-03-12 11:44:28.141000-04:00'
@@ -0,0 +1,199 @@
+# Fast, deterministic timestamp parsing shared by the ingest script and the dashboard.
+#
+# Every device family writes ISO 8601 timestamps of a fixed shape:
+#
+#     MCCI (InfluxDB export)   2024-03-12T15:44:28.141Z
+#     processed CSVs           2024-03-12 11:44:28.141000-04:00
+#     PurpleAir                2024-03-31T20:00:00Z
+#     Awair                    2024-08-26T17:05:00          (Eastern wall-clock time)
+#
+# The layout is detected once per string length, from the first value of that length, and
+# all values of that length are converted together with integer arithmetic on their digits,
+# instead of pandas' per-file format inference (which drops to a slow path for mixed UTC
+# offsets). Values that do not fit the detected layout are parsed by pandas.
+#
+# Times without an offset are localized to naive_tz. In the hour repeated when DST ends,
+# readings are taken as the first (DST) pass until the wall clock steps backwards in the file,
+# and as the second (standard time) pass after that, so the same file always gives the same
+# result. Wall-clock times skipped when DST starts are shifted forward.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+TIMEZONE = 'America/New_York'
+
+ISO_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,9}))?(Z|[+-]\d{2}:?\d{2})?')
+NS_PER_SECOND = 1_000_000_000
+NAT = np.iinfo('int64').min
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+# Positions of each field in strings shaped like `sample`, or None if it is not ISO 8601
+def detect_layout(sample):
+    match = ISO_PATTERN.fullmatch(sample)
+    if match is None:
+        return None
+    layout = {name: match.span(i + 1) for i, name in enumerate(['year', 'month', 'day', 'hour', 'minute', 'second'])}
+    layout['fraction'] = match.span(7) if match.group(7) else None
+    zone = match.group(8)
+    if zone is None:
+        layout['offset'] = None
+    elif zone == 'Z':
+        layout['offset'] = 'Z'
+    else:
+        start = match.start(8)
+        layout['offset'] = (start, start + 1, match.end(8) - 2)  # sign, hours, minutes
+    # Every other character (separators) must match exactly
+    digits = set()
+    for key in ['year', 'month', 'day', 'hour', 'minute', 'second', 'fraction']:
+        if layout[key] is not None:
+            digits.update(range(*layout[key]))
+    if isinstance(layout['offset'], tuple):
+        sign, hours, minutes = layout['offset']
+        digits.update([sign, hours, hours + 1, minutes, minutes + 1])
+    layout['literals'] = [(i, ord(sample[i])) for i in range(len(sample)) if i not in digits]
+    return layout
+
+
+def _number(digits, span):
+    start, end = span
+    value = digits[:, start].astype('int64')
+    for i in range(start + 1, end):
+        value *= 10
+        value += digits[:, i]
+    return value
+
+
+# Days since 1970-01-01 of a proleptic Gregorian date (Howard Hinnant's days_from_civil)
+def _days_from_civil(year, month, day):
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+# Parse same-length strings, given as rows of byte codes, with a layout; returns
+# (nanoseconds, has_offset, ok) arrays, where the nanoseconds are UTC for values with an
+# offset and wall-clock time otherwise
+def _parse_fixed(chars, layout):
+    width = chars.shape[1]
+    ok = np.ones(len(chars), dtype=bool)
+    for i, char in layout['literals']:
+        ok &= chars[:, i] == char
+    # Non-digits in digit positions wrap around to values above 9
+    digits = chars - np.uint8(ord('0'))
+    digit_cols = [c for c in range(width) if c not in {i for i, _ in layout['literals']}]
+    if isinstance(layout['offset'], tuple):
+        digit_cols = [c for c in digit_cols if c != layout['offset'][0]]
+    ok &= (digits[:, digit_cols] <= 9).all(axis=1)
+
+    fields = {k: _number(digits, layout[k]) for k in ['year', 'month', 'day', 'hour', 'minute', 'second']}
+    month = np.clip(fields['month'], 1, 12)
+    year = fields['year']
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = DAYS_IN_MONTH[month - 1] + (leap & (month == 2))
+    ok &= (fields['month'] >= 1) & (fields['month'] <= 12) & (fields['day'] >= 1) & (fields['day'] <= month_days)
+    ok &= (fields['hour'] <= 23) & (fields['minute'] <= 59) & (fields['second'] <= 59)
+    days = _days_from_civil(fields['year'], fields['month'], fields['day'])
+    ns = ((days * 24 + fields['hour']) * 60 + fields['minute']) * 60 + fields['second']
+    ns = ns * NS_PER_SECOND
+    if layout['fraction'] is not None:
+        start, end = layout['fraction']
+        ns += _number(digits, layout['fraction']) * 10 ** (9 - (end - start))
+
+    offset = layout['offset']
+    if isinstance(offset, tuple):
+        sign, hours, minutes = offset
+        minutes_off = _number(digits, (hours, hours + 2)) * 60 + _number(digits, (minutes, minutes + 2))
+        direction = np.where(chars[:, sign] == ord('-'), -1, 1)
+        ok &= (chars[:, sign] == ord('-')) | (chars[:, sign] == ord('+'))
+        ns -= direction * minutes_off * 60 * NS_PER_SECOND
+    has_offset = np.full(len(chars), offset is not None)
+    return ns, has_offset, ok
+
+
+# Parse values pandas-side; returns (nanoseconds, has_offset) like _parse_fixed
+def _parse_fallback(values):
+    ns = np.full(len(values), NAT, dtype='int64')
+    has_offset = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            ts = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            continue
+        if ts is pd.NaT:
+            continue
+        if ts.tzinfo is not None:
+            ts = ts.tz_convert('UTC').tz_localize(None)
+            has_offset[i] = True
+        ns[i] = ts.as_unit('ns').value
+    return ns, has_offset
+
+
+# Nanoseconds for every value (missing ones are NaT), grouped by string length so each group
+# is parsed with one layout
+def _parse_values(values):
+    ns = np.full(len(values), NAT, dtype='int64')
+    has_offset = np.zeros(len(values), dtype=bool)
+    present = np.flatnonzero(~pd.isna(values))
+    try:
+        text = values[present].astype(bytes)
+    except UnicodeEncodeError:
+        text = np.array([str(v).encode('utf-8') for v in values[present]], dtype=bytes)
+    chars = np.frombuffer(text.tobytes(), dtype=np.uint8).reshape(len(text), text.itemsize)
+    lengths = np.strings.str_len(text)
+    fallback = np.zeros(len(values), dtype=bool)
+    for width in np.unique(lengths):
+        group = np.flatnonzero(lengths == width)
+        rows = present[group]
+        layout = detect_layout(text[group[0]].decode('utf-8', errors='replace'))
+        if layout is None:
+            fallback[rows] = True
+            continue
+        group_ns, group_offset, ok = _parse_fixed(chars[group, :width], layout)
+        ns[rows[ok]] = group_ns[ok]
+        has_offset[rows[ok]] = group_offset[ok]
+        fallback[rows[~ok]] = True
+    rows = np.flatnonzero(fallback)
+    if len(rows):
+        ns[rows], has_offset[rows] = _parse_fallback(values[rows])
+    return ns, has_offset
+
+
+# Localize wall-clock nanoseconds to tz. Ambiguous times (the hour repeated when DST ends)
+# are first-pass (DST) until, within that day, a reading steps back in time; from then on they
+# are second-pass (standard time).
+def _localize(local_ns, tz):
+    index = pd.DatetimeIndex(local_ns.view('datetime64[ns]'))
+    result = index.tz_localize(tz, ambiguous='NaT', nonexistent='shift_forward').asi8.copy()
+    rows = np.flatnonzero((result == NAT) & (local_ns != NAT))
+    if not len(rows):
+        return result
+    local = local_ns[rows]
+    day = local // (86400 * NS_PER_SECOND)
+    stepped_back = np.r_[False, (np.diff(local) < 0) & (np.diff(day) == 0)]
+    second_pass = np.zeros(len(rows), dtype=bool)
+    for d in np.unique(day):
+        same_day = day == d
+        second_pass[same_day] = np.cumsum(stepped_back[same_day]) > 0
+    result[rows] = index[rows].tz_localize(tz, ambiguous=~second_pass).asi8
+    return result
+
+
+# Parse timestamps (a Series or array of strings) to a tz-aware Series in `tz`.
+# Values without an offset are wall-clock times in naive_tz (UTC if None).
+def parse_times(values, naive_tz=None, tz=TIMEZONE):
+    index = values.index if isinstance(values, pd.Series) else None
+    raw = np.asarray(values, dtype=object)
+    ns, has_offset = _parse_values(raw)
+
+    naive = ~has_offset & (ns != NAT)
+    if naive_tz is not None and naive.any():
+        ns = np.where(naive, _localize(np.where(naive, ns, NAT), naive_tz), ns)
+
+    times = pd.DatetimeIndex(ns.view('datetime64[ns]'), tz='UTC').tz_convert(tz)
+    return pd.Series(times, index=index, name=getattr(values, 'name', None))
@@ -0,0 +1,29 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:server
+#
+# With preload_app, this module is imported once in the gunicorn master. The device frames
+# are parsed here, before the workers are forked, so every worker shares the same pages
+# copy-on-write instead of parsing the CSVs again on its first requests.
+
+import gc
+import os
+
+from app import data_dir, rollup_dir, server, store_dir, warm_cache
+from rollups import build_all
+from storage import migrate
+
+# With FAST_START=1 (see gunicorn.conf.py) each worker imports this after the port is bound
+# and loads the data in the background instead
+if os.environ.get('FAST_START') != '1':
+    # data_store and data_rollups are generated, not deployed: build the devices whose
+    # partitions or tiers are missing or older than their CSV (all of them on a fresh dyno),
+    # so the views and summaries read from them rather than falling back to the CSVs
+    migrate(data_dir, store_dir, stale_only=True)
+    build_all(data_dir, rollup_dir, stale_only=True)
+    stats = warm_cache()
+    print(f"Preloaded {stats['entries']} frames ({stats['bytes'] / 1e6:.1f} MB)")
+
+    # Objects created so far are never collected; keeping them out of the collector's
+    # bookkeeping stops it from writing to (and so un-sharing) their pages in the workers
+    gc.freeze()
+
+application = server